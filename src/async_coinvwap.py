@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import ssl
+from typing import AsyncIterator
+
+from coinvwap import CoinvwapBase
+from payload import FrameDecoder
+from vwap import VWAPUpdate
+
+
+class AsyncCoinvwap(CoinvwapBase):
+    """
+    asyncio counterpart of Coinvwap, takes the same arguments.
+    Many feeds and their consumers can share one event loop:
+
+        async for update in AsyncCoinvwap(product_ids=["BTC-USD"]):
+            print(update.product_id, update.vwap)
+    """
+
+    # bytes requested from the stream reader per read
+    READ_SIZE = 65536
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.reader = None
+        self.writer = None
+        self.ssl_context = None
+
+    async def connect(self):
+        ssl_context = self.ssl_context
+        if ssl_context is None and self.handler.get_is_secure():
+            # one context for every reconnect, asyncio sets TCP_NODELAY itself
+            ssl_context = self.ssl_context = ssl.create_default_context(
+                purpose=ssl.Purpose.SERVER_AUTH
+            )
+        self.reader, self.writer = await asyncio.open_connection(
+            self.handler.get_host(),
+            self.handler.get_port(),
+            ssl=ssl_context,
+            server_hostname=self.handler.get_host() if ssl_context else None,
+        )
+        self.decoder = FrameDecoder()
+        await self._switch_protocol()
+        self.connected = True
+
+    async def _switch_protocol(self):
+        self.writer.write(self.handler.get_init_request())
+        self._switched(await self.reader.readuntil(b"\r\n\r\n"))
+
+    def _send(self, data: bytes) -> None:
+        self.writer.write(data)
+
+    async def updates(self) -> AsyncIterator[VWAPUpdate]:
+        """
+        Subscribe and yield a VWAPUpdate for every stored data point.
+        """
+        if not self.connected:
+            await self.connect()
+        self.apply_removals()
+        logging.debug("-- Channels subscription --")
+        self.writer.write(self.handler.get_subscription())
+
+        decoder = self.decoder
+        while self.connected:
+            started = self._read_started()
+            data = await self.reader.read(self.READ_SIZE)
+            mark = self._read_done(started)
+            if not data:
+                self._closed_by_server()
+                break
+            decoder.feed(data)
+            if self.removals:
+                self.apply_removals()
+            for update in self.frame_updates(decoder.frames(), mark):
+                yield update
+            # flush pongs, a no-op unless the transport is backed up
+            await self.writer.drain()
+
+    def __aiter__(self) -> AsyncIterator[VWAPUpdate]:
+        return self.updates()
+
+    async def disconnect(self):
+        self.connected = False
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
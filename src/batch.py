@@ -0,0 +1,340 @@
+"""
+Offline VWAP over historical trade dumps (CSV or NDJSON), in two
+streaming passes so the dumps may be larger than the memory:
+
+- parse: the file is split into byte ranges aligned on lines and every
+  worker process parses its own range, spilling the (product_id, price,
+  size, time) records to one bucket file per owner, a stable hash of
+  the product_id. Gzipped files are streamed as a single range.
+- vwap: every worker reads its bucket of each range, in range order, so
+  its products' points go through the same RingBuffer VWAPStore uses in
+  file order and the series match the live results exactly. The rows
+  are written to one output file per worker, then concatenated.
+
+A single process skips the spill. CSV files need a header line and go
+through the csv module (quoted values may not span lines); NDJSON files
+hold one JSON object per line.
+"""
+import argparse
+import csv
+import gzip
+import mmap
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from array import array
+from contextlib import ExitStack
+from typing import IO, Dict, Iterator, List, NamedTuple, Sequence, Tuple
+
+from decoders import JsonDecoder
+from fixedpoint import new_window
+
+
+class VWAPSeries(NamedTuple):
+    """
+    Rolling VWAP of a product after each of its trades.
+    """
+
+    times: List[str]
+    # one array per horizon
+    vwaps: List[array]
+    points: array
+
+
+def _lines(path: str, start: int = 0, end: int or None = None) -> Iterator[bytes]:
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as dump:
+            yield from dump
+        return
+    if not os.path.getsize(path):
+        return
+    with open(path, "rb") as dump:
+        with mmap.mmap(dump.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            find = data.find
+            carret = start
+            end = len(data) if end is None else end
+            while carret < end:
+                newline = find(b"\n", carret, end)
+                if newline < 0:
+                    newline = end
+                yield data[carret:newline]
+                carret = newline + 1
+
+
+def _ranges(path: str, parts: int) -> List[Tuple[int, int or None]]:
+    """
+    `parts` byte ranges of the file, each starting at a line.
+    """
+    size = 0 if path.endswith(".gz") else os.path.getsize(path)
+    if not size:
+        return [(0, None)]
+    with open(path, "rb") as dump:
+        with mmap.mmap(dump.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            bounds = [0]
+            for part in range(1, parts):
+                newline = data.find(b"\n", max(size * part // parts, 1) - 1)
+                bounds.append(size if newline < 0 else newline + 1)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _owner(product_id: str, workers: int) -> int:
+    return zlib.crc32(product_id.encode()) % workers
+
+
+def _csv_records(path: str, fields: Dict, start: int, end: int or None) -> Iterator:
+    header = next(csv.reader([next(_lines(path), b"").decode()]), [])
+    columns = [header.index(fields[key]) for key in ("product", "price", "size")]
+    time_column = header.index(fields["time"]) if fields["time"] in header else None
+    product_column, price_column, size_column = columns
+    rows = csv.reader(line.decode() for line in _lines(path, start, end))
+    if not start:
+        next(rows, None)
+    for values in rows:
+        if len(values) < len(header):
+            continue
+        yield (
+            values[product_column],
+            values[price_column],
+            values[size_column],
+            values[time_column] if time_column is not None else None,
+        )
+
+
+def _ndjson_records(path: str, fields: Dict, start: int, end: int or None) -> Iterator:
+    loads = JsonDecoder()
+    for line in _lines(path, start, end):
+        if not line.strip():
+            continue
+        payload = loads(line)
+        if fields["type"] and payload.get("type") != fields["type"]:
+            continue
+        yield (
+            payload[fields["product"]],
+            payload[fields["price"]],
+            payload[fields["size"]],
+            payload.get(fields["time"]),
+        )
+
+
+def _records(path: str, fields: Dict, start: int = 0, end: int or None = None):
+    if fields["format"] == "csv":
+        return _csv_records(path, fields, start, end)
+    return _ndjson_records(path, fields, start, end)
+
+
+def _spill(
+    path: str, fields: Dict, start: int, end: int or None, buckets: Sequence[str]
+) -> None:
+    """
+    Parses the byte range, writing each record to its owner's bucket.
+    """
+    with ExitStack() as stack:
+        writers = [
+            csv.writer(
+                stack.enter_context(open(bucket, "w", encoding="utf-8", newline=""))
+            )
+            for bucket in buckets
+        ]
+        workers = len(writers)
+        for record in _records(path, fields, start, end):
+            writers[_owner(record[0], workers)].writerow(record)
+
+
+def _spilled(buckets: Sequence[str]) -> Iterator:
+    for bucket in buckets:
+        with open(bucket, encoding="utf-8", newline="") as records:
+            for product_id, price, size, stamp in csv.reader(records):
+                yield product_id, price, size, stamp or None
+
+
+def _write_rows(records: Iterator, window, increments, output: IO) -> None:
+    windows = {}
+    for product_id, price, size, stamp in records:
+        buffer = windows.get(product_id)
+        if buffer is None:
+            buffer = windows[product_id] = new_window(product_id, window, increments)
+        if increments is None:
+            buffer.append(float(price), float(size))
+        else:
+            buffer.append(*buffer.parse(price, size))
+        vwaps = ",".join(repr(buffer.vwap(idx)) for idx in range(len(buffer.horizons)))
+        output.write(f"{product_id},{stamp or ''},{vwaps},{buffer.points()}\n")
+
+
+def vwap_worker(buckets: Sequence[str], fields: Dict, window, output: str) -> None:
+    """
+    Series of the products spilled to `buckets` (in file order),
+    written to the `output` CSV.
+    """
+    with open(output, "w", encoding="utf-8", buffering=1 << 20) as rows:
+        _write_rows(_spilled(buckets), window, fields["increments"], rows)
+
+
+def _parallel(  # pylint: disable=too-many-arguments
+    path: str, fields: Dict, window, processes: int, output: IO, work_dir: str
+) -> None:
+    ranges = _ranges(path, processes)
+    with tempfile.TemporaryDirectory(dir=work_dir) as spill_dir:
+        buckets = [
+            [
+                os.path.join(spill_dir, f"{part}-{worker}.csv")
+                for worker in range(processes)
+            ]
+            for part in range(len(ranges))
+        ]
+        outputs = [
+            os.path.join(spill_dir, f"vwap-{worker}.csv") for worker in range(processes)
+        ]
+        with multiprocessing.get_context().Pool(processes) as pool:
+            pool.starmap(
+                _spill,
+                [
+                    (path, fields, *ranges[part], buckets[part])
+                    for part in range(len(ranges))
+                ],
+            )
+            # the workers own disjoint products
+            pool.starmap(
+                vwap_worker,
+                [
+                    (
+                        [part[worker] for part in buckets],
+                        fields,
+                        window,
+                        outputs[worker],
+                    )
+                    for worker in range(processes)
+                ],
+            )
+        for part in outputs:
+            with open(part, encoding="utf-8") as rows:
+                shutil.copyfileobj(rows, output, 1 << 20)
+
+
+def write_vwap(  # pylint: disable=too-many-arguments
+    path: str,
+    output: IO,
+    window: int or Sequence[int] = 200,
+    processes: int or None = None,
+    file_format: str or None = None,
+    price_field: str = "price",
+    quantity_field: str = "size",
+    type_field: str or None = None,
+    product_field: str = "product_id",
+    time_field: str = "time",
+    increments: Dict[str, Tuple[str, str]] or None = None,
+    work_dir: str or None = None,
+) -> None:
+    """
+    Writes the rolling VWAP series of every product of a trade dump to
+    `output`, a CSV of product_id, time, one VWAP per horizon and the
+    point count; the rows of a product are in file order.
+    The format comes from the extension (.csv, .ndjson, .jsonl, maybe .gz)
+    unless given; type_field keeps only the NDJSON lines of that type.
+    increments turns the exact fixed-point windows on, as in VWAPStore.
+    The spilled records (about the size of the dump) go to `work_dir`,
+    the system temporary directory by default.
+    """
+    if file_format is None:
+        name = path[:-3] if path.endswith(".gz") else path
+        file_format = "csv" if name.endswith(".csv") else "ndjson"
+    fields = {
+        "format": file_format,
+        "product": product_field,
+        "price": price_field,
+        "size": quantity_field,
+        "type": type_field,
+        "time": time_field,
+        "increments": increments,
+    }
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _write_rows(_records(path, fields), window, increments, output)
+    else:
+        _parallel(path, fields, window, processes, output, work_dir)
+
+
+def read_series(rows: Iterator[str]) -> Dict[str, VWAPSeries]:
+    """
+    Series by product_id of write_vwap's CSV rows.
+    """
+    series: Dict[str, VWAPSeries] = {}
+    for row in rows:
+        product_id, stamp, *vwaps, points = row.rstrip("\n").split(",")
+        product_series = series.get(product_id)
+        if product_series is None:
+            product_series = series[product_id] = VWAPSeries(
+                [], [array("d") for _ in vwaps], array("q")
+            )
+        product_series.times.append(stamp or None)
+        for column, vwap in zip(product_series.vwaps, vwaps):
+            column.append(float(vwap))
+        product_series.points.append(int(points))
+    return series
+
+
+def batch_vwap(path: str, **options) -> Dict[str, VWAPSeries]:
+    """
+    Rolling VWAP series of every product of a trade dump, held in memory;
+    takes write_vwap's options, which streams large dumps to a file instead.
+    """
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as output:
+        write_vwap(path, output, **options)
+        output.seek(0)
+        return read_series(output)
+
+
+def write_series(series: Dict[str, VWAPSeries], output) -> None:
+    """
+    CSV of product_id, time, one VWAP per horizon and the point count.
+    """
+    for product_id in sorted(series):
+        product_series = series[product_id]
+        prefix = product_id + ","
+        for row, stamp in enumerate(product_series.times):
+            vwaps = ",".join(repr(vwaps[row]) for vwaps in product_series.vwaps)
+            output.write(
+                f"{prefix}{stamp or ''},{vwaps},{product_series.points[row]}\n"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rolling VWAP series of a historical trade dump."
+    )
+    parser.add_argument("path")
+    parser.add_argument("--window", default="200", help="size, or sizes: 50,200")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--format", choices=("csv", "ndjson"), default=None)
+    parser.add_argument("--price-field", default="price")
+    parser.add_argument("--quantity-field", default="size")
+    parser.add_argument("--type", default=None, help="e.g. match, NDJSON only")
+    parser.add_argument("--output", default=None, help="CSV file, stdout otherwise")
+    parser.add_argument("--fixed-point", action="store_true")
+    parser.add_argument("--work-dir", default=None, help="for the spilled records")
+    args = parser.parse_args()
+
+    windows = [int(size) for size in args.window.split(",")]
+    options = {
+        "window": windows[0] if len(windows) == 1 else windows,
+        "processes": args.processes,
+        "file_format": args.format,
+        "price_field": args.price_field,
+        "quantity_field": args.quantity_field,
+        "type_field": args.type,
+        "increments": {} if args.fixed_point else None,
+        "work_dir": args.work_dir,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", buffering=1 << 20) as output:
+            write_vwap(args.path, output, **options)
+    else:
+        write_vwap(args.path, sys.stdout, **options)
+
+
+if __name__ == "__main__":
+    main()
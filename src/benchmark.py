@@ -0,0 +1,104 @@
+import argparse
+import os
+import time
+from typing import Dict, List
+
+from coinvwap import Coinvwap
+from mockserver import MockCoinbaseServer
+from payload import parse_time
+from report import Reporter
+from vwap import VWAPUpdate
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of already sorted values.
+    """
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class LatencySink:
+    """
+    Coinvwap.listen sink recording the tick-to-report latency of every
+    update, placed after the report sinks.
+    """
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+
+    def publish(self, update: VWAPUpdate) -> None:
+        self.latencies.append(time.time() - parse_time(update.time))
+
+    def close(self) -> None:
+        pass
+
+
+def run_benchmark(**options) -> Dict:
+    """
+    Stream synthetic tickers from a MockCoinbaseServer through the whole
+    Coinvwap connect -> listen path and measure it.
+    Options are passed to MockCoinbaseServer (rate, messages, products,
+    frame_size, coalesce, segment, compress).
+    Every update goes through consume() and a Reporter flushing its line
+    to the null device; latency is measured from the `time` the mock
+    server put in the ticker to the moment that line is written.
+    """
+    server = MockCoinbaseServer(**options).start()
+    try:
+        cvp = Coinvwap(
+            product_ids=server.product_ids,
+            url=server.url,
+            compression=options.get("compress", False),
+        )
+        cvp.connect()
+        latency = LatencySink()
+        with open(os.devnull, "wb") as null:
+            reporter = Reporter(cvp.vwap, null)
+            started = time.perf_counter()
+            cvp.consume(cvp.updates(), sinks=[reporter, latency])
+            elapsed = time.perf_counter() - started
+        cvp.sock.close()
+    finally:
+        server.stop()
+
+    latencies = sorted(latency.latencies)
+    return {
+        "messages": len(latencies),
+        "seconds": elapsed,
+        "msgs_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "p999_ms": percentile(latencies, 0.999) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Coinvwap end-to-end load benchmark against a local mock feed."
+    )
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--rate", type=float, default=0, help="msgs/sec, 0 = max")
+    parser.add_argument("--products", type=int, default=3)
+    parser.add_argument("--frame-size", type=int, default=0)
+    parser.add_argument("--coalesce", type=int, default=1)
+    parser.add_argument("--segment", type=int, default=0)
+    parser.add_argument("--compress", action="store_true", help="permessage-deflate")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        messages=args.messages,
+        rate=args.rate,
+        products=args.products,
+        frame_size=args.frame_size,
+        coalesce=args.coalesce,
+        segment=args.segment,
+        compress=args.compress,
+    )
+    for key, value in results.items():
+        print(f"{key}\t{value:.3f}" if isinstance(value, float) else f"{key}\t{value}")
+
+
+if __name__ == "__main__":
+    main()
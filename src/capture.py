@@ -0,0 +1,146 @@
+"""
+Raw feed capture and replay.
+
+A capture file starts with MAGIC, followed by one record per text frame:
+a little-endian (int64 timestamp in ns, uint32 length) header and the raw
+payload bytes, exactly as they came out of the receive loop.
+"""
+import argparse
+import mmap
+import struct
+import time
+from typing import Callable, Iterator, Tuple
+
+from decoders import get_decoder
+from payload import parse_payload
+from vwap import VWAPStore, VWAPUpdate
+
+MAGIC = b"CVWAPCAP"
+RECORD_HEADER = struct.Struct("<qI")
+
+
+class CaptureWriter:
+    """
+    Appends timestamped, length-prefixed payloads to a capture file.
+    """
+
+    def __init__(self, path: str, buffering: int = 1 << 20) -> None:
+        self.path = path
+        self.file = open(  # pylint: disable=consider-using-with
+            path, "wb", buffering=buffering
+        )
+        self.file.write(MAGIC)
+        self.records = 0
+
+    def write(self, payload, timestamp: int or None = None) -> None:
+        if timestamp is None:
+            timestamp = time.time_ns()
+        self.file.write(RECORD_HEADER.pack(timestamp, len(payload)))
+        self.file.write(payload)
+        self.records += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "CaptureWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class CaptureReader:
+    """
+    Memory-maps a capture file and iterates over its records.
+    Payloads are memoryview slices of the map, release them
+    (or drop them) before closing the reader.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as capture:
+            self.mmap = mmap.mmap(capture.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[: len(MAGIC)] != MAGIC:
+            self.mmap.close()
+            raise ValueError(f"{path} is not a capture file")
+
+    def __iter__(self) -> Iterator[Tuple[int, memoryview]]:
+        unpack_from = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        carret = len(MAGIC)
+        end = len(self.mmap)
+        with memoryview(self.mmap) as view:
+            while carret + header_size <= end:
+                timestamp, length = unpack_from(self.mmap, carret)
+                carret += header_size
+                if carret + length > end:
+                    # truncated last record, the capture was interrupted
+                    return
+                yield timestamp, view[carret : carret + length]
+                carret += length
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def replay(
+    path: str,
+    store: VWAPStore,
+    paced: bool = False,
+    speed: float = 1.0,
+    decode: Callable = parse_payload,
+) -> Iterator[VWAPUpdate]:
+    """
+    Feed a capture through VWAPStore.store, yielding the updates.
+    At full speed by default, or at the recorded pace (scaled by `speed`).
+    `decode` turns the raw payloads into dicts, see decoders.get_decoder.
+    """
+    with CaptureReader(path) as reader:
+        started = first = None
+        for timestamp, payload in reader:
+            if paced:
+                if first is None:
+                    started, first = time.monotonic(), timestamp
+                delay = (timestamp - first) / 1e9 / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            product_id = store.store(decode(payload))
+            payload.release()
+            if product_id:
+                yield store.update(product_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a raw feed capture.")
+    parser.add_argument("path")
+    parser.add_argument("--products", default="BTC-USD,ETH-USD,ETH-BTC")
+    parser.add_argument("--paced", action="store_true")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--decoder", default="json")
+    parser.add_argument("--fixed-point", action="store_true")
+    args = parser.parse_args()
+
+    store = VWAPStore(
+        args.products.split(","),
+        "price",
+        "last_size",
+        increments={} if args.fixed_point else None,
+    )
+    decode = get_decoder(args.decoder, store)
+    started = time.perf_counter()
+    count = sum(
+        1 for _ in replay(args.path, store, args.paced, args.speed, decode=decode)
+    )
+    elapsed = time.perf_counter() - started
+    print(f"{count} updates in {elapsed:.3f}s, {count / elapsed:.0f} updates/s")
+    print(store.report(point_counts=True), end="")
+
+
+if __name__ == "__main__":
+    main()
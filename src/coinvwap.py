@@ -1,19 +1,28 @@
+import abc
 import logging
 import signal
-import socket
-import ssl
 import sys
-from typing import List
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Tuple
 
-from handshake import ProtocolHandler
-from payload import split_frames
-from vwap import VWAPStore
+from capture import CaptureWriter
+from connection import ConnectionFactory
+from decoders import get_decoder
+from handshake import HandshakeError, ProtocolHandler
+from payload import FrameDecoder, close_frame, parse_time, pong_frame
+from registry import LazyVWAPStore
+from stats import Stats
+from subscribe import ABNF
+from vwap import VWAPStore, VWAPUpdate
 
 
-class Coinvwap:
+class CoinvwapBase(abc.ABC):  # pylint: disable=too-many-instance-attributes
     """
-    Main class handling the connection and websocket listening.
-    listen method can be used with threading.
+    Feed setup shared by the blocking and the asyncio clients:
+    the handshake handler, the VWAP store and control frames handling.
+    Subclasses provide the transport, at least _send.
     """
 
     def __init__(  # pylint: disable=too-many-arguments
@@ -24,6 +33,13 @@ class Coinvwap:
         type_field: str = "ticker",
         price_field: str = "price",
         quantity_field: str = "last_size",
+        window: int or List[int] = 200,
+        decoder: str or Callable = "json",
+        stats: Stats or None = None,
+        compression: bool = False,
+        max_windows: int or None = None,
+        idle_seconds: float or None = None,
+        increments: Dict[str, Tuple[str, str]] or None = None,
     ) -> None:
         self.url = url
         if product_ids:
@@ -31,16 +47,228 @@ class Coinvwap:
         else:
             self.product_ids = ["BTC-USD", "ETH-USD", "ETH-BTC"]
         self.channel = channel
-        self.handler = ProtocolHandler(self.url, self.product_ids, self.channel)
-        self.vwap = VWAPStore(
-            product_ids=self.product_ids,
-            price_field=price_field,
-            quantity_field=quantity_field,
-            type_field=type_field,
+        store_options = {
+            "price_field": price_field,
+            "quantity_field": quantity_field,
+            "type_field": type_field,
+            "window": window,
+            # exact fixed-point windows when given, see fixedpoint.py
+            "increments": increments,
+        }
+        if max_windows or idle_seconds is not None:
+            # windows allocated on the first tick, bounded, see registry.py
+            self.vwap = LazyVWAPStore(
+                self.product_ids,
+                max_windows=max_windows,
+                idle_seconds=idle_seconds,
+                **store_options,
+            )
+        else:
+            self.vwap = VWAPStore(product_ids=self.product_ids, **store_options)
+        # one list of the subscribed products for the store and the handler,
+        # see add_products and remove_products
+        self.product_ids = self.vwap.product_ids
+        self.handler = ProtocolHandler(
+            self.url, self.product_ids, self.channel, compression
         )
+        # payload bytes -> dict, see decoders.get_decoder
+        self.decode = get_decoder(decoder, self.vwap)
+        self.decoder = None
+        self.connected = False
+        self.capture = None
+        # per-stage instrumentation, off (None) by default
+        self.stats = stats
+        # products unsubscribed while connected, their windows are freed
+        # by the thread storing the payloads, see apply_removals
+        self.removals = deque()
+        self.removals_lock = threading.Lock()
+
+    def record(self, path: str) -> None:
+        """
+        Record every received text payload into a capture file,
+        see capture.replay to feed it back offline.
+        """
+        self.stop_recording()
+        self.capture = CaptureWriter(path)
+
+    def stop_recording(self) -> None:
+        if self.capture:
+            self.capture.close()
+            self.capture = None
+
+    @abc.abstractmethod
+    def _send(self, data: bytes) -> None:
+        """
+        Send raw frame bytes over the connection.
+        """
+
+    def add_products(self, product_ids: List[str]) -> List[str]:
+        """
+        Start following more products without reconnecting: their windows
+        are allocated, then subscribed to over the live connection.
+        Products with a pending removal keep their window and are
+        subscribed to again. Returns the products actually added.
+        """
+        # sent under the lock so the (un)subscriptions go out in order
+        with self.removals_lock:
+            cancelled = self._cancel_removals(product_ids)
+            added = self.vwap.add_products(product_ids)
+            subscribed = [pid for pid in dict.fromkeys(product_ids) if pid in cancelled]
+            subscribed += added
+            if subscribed and self.connected:
+                self._send(self.handler.get_subscription(subscribed))
+        if added:
+            self._products_changed()
+        return subscribed
+
+    def _cancel_removals(self, product_ids: List[str]) -> set:
+        cancelled = set()
+        for removal in self.removals:
+            cancelled.update(pid for pid in removal if pid in product_ids)
+            removal[:] = [pid for pid in removal if pid not in product_ids]
+        return cancelled
+
+    def remove_products(self, product_ids: List[str]) -> List[str]:
+        """
+        Stop following products without reconnecting: unsubscribed first,
+        then their windows are freed. Returns the products actually removed.
+
+        While connected, the windows are freed by the thread storing the
+        payloads (between two of them, see apply_removals), so a removal
+        never races with the store and update of a payload in flight.
+        """
+        with self.removals_lock:
+            pending = {pid for removal in self.removals for pid in removal}
+            removed = [
+                pid
+                for pid in dict.fromkeys(product_ids)
+                if pid in self.vwap.product_ids and pid not in pending
+            ]
+            if removed and self.connected:
+                self._send(self.handler.get_subscription(removed, "unsubscribe"))
+                self.removals.append(removed)
+                return removed
+        removed = self.vwap.remove_products(removed)
+        if removed:
+            self._products_changed()
+        return removed
+
+    def apply_removals(self) -> None:
+        """
+        Free the windows of the pending removals, called by the thread
+        storing the payloads.
+        """
+        changed = False
+        with self.removals_lock:
+            while self.removals:
+                changed |= bool(self.vwap.remove_products(self.removals.popleft()))
+        if changed:
+            self._products_changed()
+
+    def _products_changed(self) -> None:
+        """
+        Hook called once the followed products changed.
+        """
+
+    def _switched(self, response: bytes) -> None:
+        """
+        Check the 101 response and set the decoder up for the extensions
+        it agreed on.
+        """
+        logging.debug(response)
+        self.handler.check_switch_response(response)
+        params = None
+        if self.handler.compression:
+            params = self.handler.get_deflate_params(response)
+        if params is not None:
+            logging.debug("-- permessage-deflate: %s --", params)
+            self.decoder.enable_deflate(
+                context_takeover="server_no_context_takeover" not in params
+            )
+        logging.debug("-- Switched to websockets --")
+
+    def _read_started(self) -> int or None:
+        return time.perf_counter_ns() if self.stats else None
+
+    def _read_done(self, started: int or None) -> int or None:
+        """
+        Record the recv stage of a read from _read_started, returns the
+        mark the decode stage starts from (None without stats).
+        """
+        if started is None:
+            return None
+        mark = time.perf_counter_ns()
+        self.stats.record("recv", mark - started)
+        return mark
+
+    def _closed_by_server(self) -> None:
+        logging.debug("-- Connection closed by the server --")
+        self.connected = False
+
+    def frame_updates(
+        self, frames: Iterator, mark: int or None = None
+    ) -> Iterator[VWAPUpdate]:
+        """
+        Updates of decoded (opcode, payload) frames, control frames are
+        answered inline: the frame loop of the blocking, asyncio and
+        pipelined clients.
+
+        With stats, the decode stage runs from `mark` (perf_counter_ns once
+        the data was read, None when the frames were decoded elsewhere) to
+        each frame, then parse and store are timed; the consumer's time
+        between two updates is left out.
+        """
+        stats, clock = self.stats, time.perf_counter_ns
+        started = parsed = None
+        for opcode, data in frames:
+            if stats:
+                started = clock()
+                if mark is not None:
+                    stats.record("decode", started - mark)
+            if opcode == ABNF.OPCODE_TEXT:
+                if self.capture:
+                    self.capture.write(data)
+                payload = self.decode(data)
+                if stats:
+                    parsed = clock()
+                    stats.record("parse", parsed - started)
+                product_id = self.vwap.store(payload)
+                if product_id:
+                    update = self.vwap.update(product_id)
+                    if stats:
+                        stats.record("store", clock() - parsed)
+                        stats.count(product_id, len(data))
+                    yield update
+            elif not self._control(opcode, data):
+                break
+            if stats and mark is not None:
+                mark = clock()
+
+    def _control(self, opcode, data) -> bool:
+        """
+        Answer control frames inline, returns False once the connection is closed.
+        """
+        if opcode == ABNF.OPCODE_PING:
+            self._send(pong_frame(data))
+        elif opcode == ABNF.OPCODE_CLOSE:
+            logging.debug("-- Close frame received --")
+            self._send(close_frame(data))
+            self.connected = False
+        return self.connected
+
+
+class Coinvwap(CoinvwapBase):
+    """
+    Main class handling the connection and websocket listening.
+    listen method can be used with threading.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
         signal.signal(signal.SIGINT, self.signal_handler)
         self.sock = None
-        self.connected = False
+        self.factory = None
+        self.send_lock = threading.Lock()
 
     def signal_handler(
         self, signal, frame
@@ -52,39 +280,86 @@ class Coinvwap:
         sys.exit(0)
 
     def connect(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        if self.handler.get_is_secure():
-            ssl_context = ssl.create_default_context(purpose=ssl.Purpose.SERVER_AUTH)
-            self.sock = ssl_context.wrap_socket(
-                self.sock, server_hostname=self.handler.get_host()
-            )
-        self.sock.connect((self.handler.get_host(), self.handler.get_port()))
-        self._switch_protocol()
+        """
+        Connect and switch to websocket through the connection factory,
+        kept across reconnects (TLS session, addresses, prebuilt requests).
+        """
+        if self.factory is None:
+            self.factory = ConnectionFactory(self.handler)
+        self.decoder = FrameDecoder()
+        self.sock, response = self.factory.connect(self.decoder)
+        try:
+            self._switched(response)
+        except HandshakeError:
+            self.sock.close()
+            raise
         self.connected = True
 
-    def _switch_protocol(self):
-        # HTTP request to switch protocol to websocket
-        logging.debug(self.handler.get_init_request())
-        self.sock.send(self.handler.get_init_request())
-
-        # Expected confirmation: 101 Switching Protocols
-        data = self.sock.recv(1024)
-        logging.debug(data)
-        if "HTTP/1.1 101 Switching Protocols" not in str(data):
-            # TODO: make a nice custom Exception
-            raise Exception("Switching protocols failed!")
-        logging.debug("-- Switched to websockets --")
-
-    def listen(self, report_fn=None):
-        # subscribe
+    def subscribe(self) -> None:
+        self.apply_removals()
         logging.debug("-- Channels subscription --")
-        self.sock.send(self.handler.get_subscription())
+        if self.factory:
+            self._send(self.factory.subscription)
+        else:
+            self._send(self.handler.get_subscription())
+
+    def _send(self, data: bytes) -> None:
+        # pongs and (un)subscriptions may come from different threads
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def _products_changed(self) -> None:
+        # the next reconnect subscribes to the current products
+        if self.factory:
+            self.factory.refresh()
 
+    def updates(self) -> Iterator[VWAPUpdate]:
+        """
+        Subscribe and yield a VWAPUpdate for every stored data point.
+        """
+        self.subscribe()
+        decoder = self.decoder
         while self.connected:
-            for payload in split_frames(self.sock.recv):
-                self.vwap.store(payload)
+            started = self._read_started()
+            received = decoder.recv_into(self.sock)
+            mark = self._read_done(started)
+            if not received:
+                self._closed_by_server()
+                break
+            if self.removals:
+                self.apply_removals()
+            yield from self.frame_updates(decoder.frames(), mark)
+
+    def listen(self, report_fn=None, sinks=()):
+        """
+        Consume the updates, report_fn gets the full report after each of them.
+        Every sink (e.g. report.Reporter) gets sink.publish(update) and
+        sink.close() once the connection is over.
+        """
+        self.consume(self.updates(), report_fn, sinks)
+
+    def consume(self, updates: Iterator[VWAPUpdate], report_fn=None, sinks=()):
+        """
+        listen() over any stream of updates, e.g. a supervisor's spanning
+        several connections.
+        """
+        try:
+            stats = self.stats
+            for update in updates:
+                if stats:
+                    started = time.perf_counter_ns()
+                for sink in sinks:
+                    sink.publish(update)
                 if report_fn:
                     report_fn(self.vwap.report(point_counts=True), end="")
+                if stats:
+                    stats.record("report", time.perf_counter_ns() - started)
+                    if update.time:
+                        latency = time.time() - parse_time(update.time)
+                        stats.record("exchange", int(latency * 1e9))
+        finally:
+            for sink in sinks:
+                sink.close()
 
     def disconnect(self):
         self.connected = False
@@ -0,0 +1,127 @@
+import logging
+import socket
+import ssl
+import time
+from typing import List, Tuple
+
+from handshake import HandshakeError, ProtocolHandler
+from payload import FrameDecoder
+
+
+class ConnectionFactory:  # pylint: disable=too-many-instance-attributes
+    """
+    Opens upgraded websocket connections for a ProtocolHandler, keeping
+    whatever can be kept between them so reconnects stay fast:
+
+    - one SSLContext, and the TLS session of the last connection to
+      resume the next one with (no full TLS handshake)
+    - the resolved addresses, cached for `dns_ttl` seconds; a failing
+      address moves to the back and the next one is tried
+    - TCP_NODELAY on every socket
+    - the upgrade request and subscription bytes, built once. Only the
+      Sec-WebSocket-Key is new for every connection.
+    """
+
+    def __init__(
+        self, handler: ProtocolHandler, timeout: float = 10.0, dns_ttl: float = 300.0
+    ) -> None:
+        self.handler = handler
+        self.timeout = timeout
+        self.dns_ttl = dns_ttl
+        self.host, self.port = handler.get_host(), handler.get_port()
+        self.ssl_context = None
+        if handler.get_is_secure():
+            self.ssl_context = ssl.create_default_context(
+                purpose=ssl.Purpose.SERVER_AUTH
+            )
+        self.session = None
+        self.addresses: List[Tuple] = []
+        self.resolved = 0.0
+        self.upgrade = self.subscription = None
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Rebuild the prebuilt bytes, after the handler changed.
+        """
+        # split around the key the request holds, the handler's key and
+        # its headers are only changed together (ProtocolHandler.set_key)
+        self.upgrade = self.handler.get_init_request().split(
+            self.handler.headers["Sec-WebSocket-Key"].encode()
+        )
+        self.subscription = self.handler.get_subscription()
+
+    def resolve(self) -> List[Tuple]:
+        if not self.addresses or time.monotonic() - self.resolved > self.dns_ttl:
+            self.addresses = [
+                (family, address)
+                for family, _, _, _, address in socket.getaddrinfo(
+                    self.host, self.port, type=socket.SOCK_STREAM
+                )
+            ]
+            self.resolved = time.monotonic()
+        return self.addresses
+
+    def connect(self, decoder: FrameDecoder) -> Tuple[socket.socket, bytes]:
+        """
+        Connected and upgraded socket, with the 101 response head.
+        Bytes the server sent right after the head are fed to the decoder.
+        """
+        addresses = self.resolve()
+        error = None
+        for entry in list(addresses):
+            try:
+                sock = self._open(*entry)
+            except OSError as ex:
+                logging.warning("-- Connecting %s failed: %s --", entry[1], ex)
+                error = ex
+                # try the others first next time
+                addresses.remove(entry)
+                addresses.append(entry)
+                continue
+            try:
+                return sock, self._upgrade(sock, decoder)
+            except BaseException:
+                sock.close()
+                raise
+        # maybe the addresses changed
+        self.addresses = []
+        raise error or OSError(f"No address for {self.host}")
+
+    def _open(self, family: int, address: Tuple) -> socket.socket:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(self.timeout)
+            sock.connect(address)
+            if self.ssl_context:
+                sock = self.ssl_context.wrap_socket(
+                    sock, server_hostname=self.host, session=self.session
+                )
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def _upgrade(self, sock: socket.socket, decoder: FrameDecoder) -> bytes:
+        key = self.handler.new_key()
+        self.handler.set_key(key)
+        sock.sendall(key.encode().join(self.upgrade))
+
+        response = b""
+        while b"\r\n\r\n" not in response:
+            data = sock.recv(4096)
+            if not data:
+                raise HandshakeError("Connection closed during the upgrade")
+            response += data
+        head, leftover = response.split(b"\r\n\r\n", 1)
+        head += b"\r\n\r\n"
+        if leftover:
+            decoder.feed(leftover)
+        if self.ssl_context:
+            # TLS 1.3 tickets come after the handshake, by now they are in
+            if sock.session_reused:
+                logging.debug("-- TLS session resumed --")
+            self.session = sock.session
+        sock.settimeout(None)
+        return head
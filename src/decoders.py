@@ -0,0 +1,133 @@
+from typing import Callable, Dict, Sequence
+
+from payload import parse_payload
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:  # pragma: no cover
+    simdjson = None
+
+
+class JsonDecoder:
+    """
+    Full JSON decoding of a payload with the fastest backend installed:
+    orjson, then simdjson, with the standard library json as a fallback.
+    """
+
+    def __init__(self, backend: str or None = None) -> None:
+        if backend is None:
+            backend = "orjson" if orjson else "simdjson" if simdjson else "json"
+        if backend == "orjson" and orjson:
+            self.loads = orjson.loads  # pylint: disable=no-member
+        elif backend == "simdjson" and simdjson:
+            self.loads = lambda data: simdjson.loads(bytes(data))
+        elif backend == "json":
+            self.loads = parse_payload
+        else:
+            raise ImportError(f"JSON backend {backend} is not installed")
+        self.backend = backend
+
+    def __call__(self, data) -> Dict:
+        return self.loads(data)
+
+
+class FieldExtractor:
+    """
+    Pulls only the configured fields straight from the raw payload bytes,
+    without building the full dict of a ticker (about 15 fields).
+
+    Meant for flat, compact JSON objects like the Coinbase feed sends.
+    String values come back as strings, the way VWAPStore expects them,
+    numbers as int or float like a full decoder returns them.
+    Payloads of other types (heartbeats, subscriptions) are not decoded,
+    they come back as just {"type": <type>}. Payloads without a compact
+    "type" (e.g. pretty-printed JSON) go through a full JSON decoding.
+    """
+
+    def __init__(
+        self,
+        fields: Sequence[str] = ("product_id", "price", "last_size", "time"),
+        type_field: str = "ticker",
+    ) -> None:
+        self.fields = tuple(fields)
+        self.type_field = type_field
+        self.type_tag = b'"type":"' + type_field.encode() + b'"'
+        self.keys = [
+            (name, f'"{name}":'.encode(), len(name) + 3) for name in self.fields
+        ]
+        self.loads = JsonDecoder()
+
+    @classmethod
+    def for_store(cls, store, extra: Sequence[str] = ()) -> "FieldExtractor":
+        """
+        Extractor of the fields a VWAPStore reads (plus `extra` ones).
+        """
+        fields = ["product_id", store.price_field, store.quantity_field]
+        fields += [store.time_field, *extra]
+        return cls(fields, store.type_field)
+
+    def __call__(self, data) -> Dict:
+        raw = bytes(data)
+        # Coinbase sends the type first, the fast path
+        if not raw.startswith(self.type_tag, 1) and self.type_tag not in raw:
+            start = raw.find(b'"type":"')
+            if start < 0:
+                return self._decode(raw)
+            return {"type": raw[start + 8 : raw.find(b'"', start + 8)].decode()}
+        find = raw.find
+        payload = {"type": self.type_field}
+        for name, key, length in self.keys:
+            start = find(key)
+            if start < 0:
+                continue
+            start += length
+            while raw[start] == 0x20:
+                start += 1
+            if raw[start] == 0x22:  # a string value
+                start += 1
+                payload[name] = raw[start : find(b'"', start)].decode()
+                continue
+            end = find(b",", start)
+            if end < 0:
+                end = find(b"}", start)
+            token = raw[start:end]
+            try:
+                payload[name] = int(token)
+            except ValueError:
+                # floats, true, false, null
+                payload[name] = self.loads(token)
+        return payload
+
+    def _decode(self, raw: bytes) -> Dict:
+        """
+        Slow path: the fields of a full decoding.
+        """
+        decoded = self.loads(raw)
+        kind = decoded.get("type") if isinstance(decoded, dict) else None
+        if kind != self.type_field:
+            return {"type": kind}
+        payload = {"type": kind}
+        for name in self.fields:
+            if name in decoded:
+                payload[name] = decoded[name]
+        return payload
+
+
+def get_decoder(decoder: str or Callable, store) -> Callable:
+    """
+    Payload decoder by name: "json" (the fastest full decoder installed),
+    "orjson", "simdjson", "stdlib" or "fields" (a FieldExtractor of the
+    store's fields). A callable is used as it is.
+    """
+    if callable(decoder):
+        return decoder
+    if decoder == "fields":
+        return FieldExtractor.for_store(store, extra=("sequence", "trade_id"))
+    if decoder == "stdlib":
+        return JsonDecoder("json")
+    return JsonDecoder(None if decoder == "json" else decoder)
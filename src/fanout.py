@@ -0,0 +1,233 @@
+import json
+import logging
+import socket
+import threading
+from collections import deque
+from typing import Dict, List
+
+from handshake import accept_upgrade
+from payload import FrameDecoder, ProtocolError
+from subscribe import ABNF
+from vwap import VWAPUpdate
+
+
+class FanoutClient:  # pylint: disable=too-many-instance-attributes
+    """
+    One subscriber: a bounded send queue drained by its own sender thread,
+    so a slow subscriber never blocks the ingest loop nor the others.
+
+    - policy "drop_oldest": keep the newest `queue_size` messages
+    - policy "conflate": keep only the latest message of every product,
+      the queue is then bounded by the product count
+
+    A reader thread drains what the subscriber sends: websocket pings are
+    answered, a close frame is echoed and ends the subscription, anything
+    else (and all of it for plain TCP) is discarded.
+    """
+
+    def __init__(
+        self,
+        conn: socket.socket,
+        policy: str,
+        queue_size: int,
+        websocket: bool = False,
+    ) -> None:
+        self.conn = conn
+        self.conflate = policy == "conflate"
+        self.queue = {} if self.conflate else deque(maxlen=queue_size)
+        self.websocket = websocket
+        self.dropped = 0
+        self.closed = False
+        self.ready = threading.Condition()
+        # the sender and the reader (pongs, close) share the socket
+        self.send_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._send, daemon=True)
+        self.thread.start()
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def offer(self, product_id: str, data: bytes) -> None:
+        with self.ready:
+            if self.conflate:
+                if self.queue.pop(product_id, None) is not None:
+                    self.dropped += 1
+                self.queue[product_id] = data
+            else:
+                if len(self.queue) == self.queue.maxlen:
+                    self.dropped += 1
+                self.queue.append(data)
+            self.ready.notify()
+
+    def _send(self) -> None:
+        while True:
+            with self.ready:
+                while not self.queue and not self.closed:
+                    self.ready.wait()
+                if self.closed:
+                    return
+                batch = list(self.queue.values() if self.conflate else self.queue)
+                self.queue.clear()
+            try:
+                with self.send_lock:
+                    self.conn.sendall(b"".join(batch))
+            except OSError as ex:
+                logging.debug("-- Subscriber gone: %s --", ex)
+                self.close()
+                return
+
+    def _read(self) -> None:
+        decoder = FrameDecoder() if self.websocket else None
+        try:
+            while not self.closed:
+                if decoder is None:
+                    if not self.conn.recv(4096):
+                        break
+                elif not decoder.recv_into(self.conn) or not self._control(decoder):
+                    break
+        except (OSError, ProtocolError) as ex:
+            logging.debug("-- Subscriber gone: %s --", ex)
+        self.close()
+
+    def _control(self, decoder: FrameDecoder) -> bool:
+        """
+        Answer the control frames received, False once closed.
+        """
+        for opcode, data in decoder.frames():
+            if opcode == ABNF.OPCODE_PING:
+                self._reply(ABNF.OPCODE_PONG, bytes(data))
+            elif opcode == ABNF.OPCODE_CLOSE:
+                # echo the status code (rfc6455#section-5.5.1)
+                self._reply(ABNF.OPCODE_CLOSE, bytes(data[:2]))
+                return False
+        return True
+
+    def _reply(self, opcode: int, data: bytes) -> None:
+        # server frames are not masked
+        frame = ABNF(1, 0, 0, 0, opcode, mask=0, data=data).format()
+        with self.send_lock:
+            self.conn.sendall(frame)
+
+    def close(self) -> None:
+        with self.ready:
+            if self.closed:
+                return
+            self.closed = True
+            self.ready.notify()
+        try:
+            # wakes the reader up, close() alone may not
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class FanoutServer:  # pylint: disable=too-many-instance-attributes
+    """
+    Serves the VWAP updates to many local subscribers, a Coinvwap.listen sink:
+
+        cvp.listen(sinks=[FanoutServer(port=8765).start()])
+
+    protocol "tcp" sends one JSON line per update, "websocket" completes the
+    upgrade and sends one JSON text frame per update (framed with ABNF).
+    Every update is serialized once and offered to every subscriber queue,
+    see FanoutClient for the overflow policies.
+
+    Handshakes run in a thread per connecting subscriber and must complete
+    within `handshake_timeout` seconds, so a stalled one delays nobody.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        protocol: str = "tcp",
+        policy: str = "drop_oldest",
+        queue_size: int = 1024,
+        handshake_timeout: float = 5.0,
+    ) -> None:
+        if protocol not in ("tcp", "websocket"):
+            raise ValueError(f"Unknown protocol {protocol}")
+        if policy not in ("drop_oldest", "conflate"):
+            raise ValueError(f"Unknown overflow policy {policy}")
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.2)
+        self.address = self.server.getsockname()[:2]
+        self.protocol = protocol
+        self.policy = policy
+        self.queue_size = queue_size
+        self.handshake_timeout = handshake_timeout
+        self.clients: List[FanoutClient] = []
+        self.lock = threading.Lock()
+        self.running = False
+        self.acceptor = None
+
+    def start(self) -> "FanoutServer":
+        self.running = True
+        self.acceptor = threading.Thread(target=self._accept_clients, daemon=True)
+        self.acceptor.start()
+        return self
+
+    def _accept_clients(self) -> None:
+        while self.running:
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(
+                target=self._open_client, args=(conn,), daemon=True
+            ).start()
+
+    def _open_client(self, conn: socket.socket) -> None:
+        websocket = self.protocol == "websocket"
+        try:
+            conn.settimeout(self.handshake_timeout)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if websocket:
+                accept_upgrade(conn)
+            conn.settimeout(None)
+        except OSError as ex:
+            logging.debug("-- Subscriber failed to connect: %s --", ex)
+            conn.close()
+            return
+        client = FanoutClient(conn, self.policy, self.queue_size, websocket)
+        with self.lock:
+            if not self.running:
+                client.close()
+                return
+            self.clients.append(client)
+
+    def encode(self, update: VWAPUpdate) -> bytes:
+        data = json.dumps(update._asdict(), separators=(",", ":")).encode()
+        if self.protocol == "websocket":
+            return ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=data).format()
+        return data + b"\n"
+
+    def publish(self, update: VWAPUpdate) -> None:
+        if not self.clients:
+            return
+        data = self.encode(update)
+        gone = False
+        for client in self.clients:
+            if client.closed:
+                gone = True
+                continue
+            client.offer(update.product_id, data)
+        if gone:
+            with self.lock:
+                self.clients = [client for client in self.clients if not client.closed]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self.clients),
+            "dropped": sum(client.dropped for client in self.clients),
+        }
+
+    def close(self) -> None:
+        self.running = False
+        if self.acceptor:
+            self.acceptor.join()
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.close()
+        self.server.close()
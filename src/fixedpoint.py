@@ -0,0 +1,126 @@
+from array import array
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from typing import Dict, Sequence, Tuple
+
+from ringbuffer import RingBuffer
+
+# Coinbase's finest increment, for products without known increments
+DEFAULT_INCREMENT = "0.00000001"
+
+# beyond this, the columns of a window hold Python ints instead of int64
+INT64_MAX = 2**63 - 1
+
+
+def decimals(increment: str) -> int:
+    """
+    Decimal places of an increment, "0.01000000" -> 2, "1e-05" -> 5.
+    """
+    return max(0, -Decimal(str(increment)).normalize().as_tuple().exponent)
+
+
+def to_scaled(value: str, places: int) -> int:
+    """
+    Decimal string -> integer count of 10 ** -places, without going
+    through a float: to_scaled("0.05123", 8) == 5123000.
+
+    Plain strings with at most `places` decimals take the fast path.
+    Finer values are rounded to the increment (half to even), numbers
+    and scientific notation go through Decimal(repr(value)).
+    """
+    text = value if isinstance(value, str) else repr(value)
+    whole, _, fraction = text.partition(".")
+    if len(fraction) <= places:
+        try:
+            return int(whole + fraction.ljust(places, "0"))
+        except ValueError:
+            pass
+    try:
+        scaled = Decimal(text).scaleb(places)
+        return int(scaled.to_integral_value(rounding=ROUND_HALF_EVEN))
+    except (InvalidOperation, OverflowError) as ex:
+        raise ValueError(f"Not a decimal number: {value!r}") from ex
+
+
+class FixedPointRingBuffer(RingBuffer):  # pylint: disable=too-many-instance-attributes
+    """
+    RingBuffer of exact data points: prices and volumes are integers
+    scaled by the product's quote and base increments, held in
+    ``array('q')`` columns, and the running sums are Python integers.
+    Nothing drifts, so the sums never need reanchoring, and the only
+    rounding is the single division of vwap(), which makes the VWAPs
+    reproducible whatever the order of the updates that led to a window.
+
+    append() takes the scaled integers, see parse(). Values beyond int64
+    (e.g. huge sizes at 8 decimals) switch the columns to Python ints.
+    """
+
+    __slots__ = ("price_decimals", "size_decimals", "price_scale", "size_scale")
+
+    def __init__(
+        self,
+        horizons: int or Sequence[int] = 200,
+        price_decimals: int = 8,
+        size_decimals: int = 8,
+    ) -> None:
+        super().__init__(horizons)
+        self.price_decimals = price_decimals
+        self.size_decimals = size_decimals
+        self.price_scale = 10**price_decimals
+        self.size_scale = 10**size_decimals
+        self.prices = array("q", bytes(8 * self.size))
+        self.vols = array("q", bytes(8 * self.size))
+        self.sums_pq = [0] * len(self.horizons)
+        self.sums_q = [0] * len(self.horizons)
+
+    def parse(self, price: str, vol: str) -> Tuple[int, int]:
+        """
+        Payload price and volume strings -> scaled integers.
+        """
+        return to_scaled(price, self.price_decimals), to_scaled(vol, self.size_decimals)
+
+    def append(self, price: int, vol: int) -> None:
+        if (price > INT64_MAX or vol > INT64_MAX) and isinstance(self.prices, array):
+            self.prices, self.vols = list(self.prices), list(self.vols)
+        super().append(price, vol)
+
+    def from_float(self, price: float, vol: float) -> Tuple[int, int]:
+        return round(price * self.price_scale), round(vol * self.size_scale)
+
+    def reanchor(self) -> None:
+        # integer sums are exact, nothing to recompute
+        self.laps = 0
+
+    def vwap(self, idx: int = 0) -> float:
+        if self.count == 0 or not self.sums_q[idx]:
+            return 0.0
+        # int / int rounds once, correctly
+        return self.sums_pq[idx] / (self.sums_q[idx] * self.price_scale)
+
+    def as_float(self) -> RingBuffer:
+        """
+        Copy of the window as a float RingBuffer, e.g. for snapshots.
+        """
+        window = RingBuffer(self.horizons)
+        price_scale, size_scale = self.price_scale, self.size_scale
+        window.prices = array("d", (price / price_scale for price in self.prices))
+        window.vols = array("d", (vol / size_scale for vol in self.vols))
+        window.sums_pq = [total / (price_scale * size_scale) for total in self.sums_pq]
+        window.sums_q = [total / size_scale for total in self.sums_q]
+        window.head, window.count, window.laps = self.head, self.count, self.laps
+        return window
+
+
+def new_window(
+    product_id: str,
+    horizons: int or Sequence[int],
+    increments: Dict[str, Tuple[str, str]] or None = None,
+) -> RingBuffer:
+    """
+    Float RingBuffer without increments, otherwise a FixedPointRingBuffer
+    scaled by the product's (quote, base) increments, DEFAULT_INCREMENT
+    for the products missing from them.
+    """
+    if increments is None:
+        return RingBuffer(horizons)
+    quote, base = increments.get(product_id, (DEFAULT_INCREMENT, DEFAULT_INCREMENT))
+    return FixedPointRingBuffer(horizons, decimals(quote), decimals(base))
@@ -1,13 +1,64 @@
 from __future__ import annotations
 
+import base64
+import hashlib
 import ipaddress
 import json
-import uuid
+import os
 from typing import List, Dict
 from urllib.parse import urlsplit
 
 from subscribe import ABNF
 
+# rfc6455#section-1.3
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def websocket_accept(key: str) -> str:
+    """
+    Sec-WebSocket-Accept value the server answers the given key with.
+    """
+    digest = hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def accept_upgrade(conn, extensions: str or None = None) -> Dict[str, str]:
+    """
+    Server side of the handshake: read the upgrade request from the socket
+    and answer it with 101 Switching Protocols. Returns the request headers.
+    `extensions` is answered as Sec-WebSocket-Extensions when the client
+    offered permessage-deflate.
+    """
+    request = b""
+    while b"\r\n\r\n" not in request:
+        data = conn.recv(4096)
+        if not data:
+            raise ConnectionError("Client closed during the upgrade")
+        request += data
+    headers = dict(
+        line.split(": ", 1)
+        for line in request.decode().split("\r\n")[1:]
+        if ": " in line
+    )
+    response = (
+        "HTTP/1.1 101 Switching Protocols\r\n"
+        "Upgrade: websocket\r\n"
+        "Connection: Upgrade\r\n"
+        f"Sec-WebSocket-Accept: {websocket_accept(headers.get('Sec-WebSocket-Key', ''))}"
+        "\r\n"
+    )
+    offered = headers.get("Sec-WebSocket-Extensions", "")
+    if extensions and "permessage-deflate" in offered:
+        response += f"Sec-WebSocket-Extensions: {extensions}\r\n"
+    conn.sendall(f"{response}\r\n".encode())
+    return headers
+
+
+class HandshakeError(Exception):
+    """
+    Raised when the server does not switch the protocol to websocket.
+    """
+
 
 class ProtocolHandler:  # pylint: disable=too-many-instance-attributes
     """
@@ -15,10 +66,14 @@ class ProtocolHandler:  # pylint: disable=too-many-instance-attributes
     It also wraps the sending of the subscription with Headers.
     """
 
-    def __init__(self, url: str, product_ids: List[str], channel: str) -> None:
+    def __init__(
+        self, url: str, product_ids: List[str], channel: str, compression: bool = False
+    ) -> None:
         self.url = url
         self.product_ids = product_ids
-        self.sec_websocket_key = f"{uuid.uuid4()}=="
+        # offer permessage-deflate (rfc7692)
+        self.compression = compression
+        self.sec_websocket_key = self.new_key()
         self.switch_headers = self._get_switch_headers()
         self.channel = channel
 
@@ -42,6 +97,10 @@ class ProtocolHandler:  # pylint: disable=too-many-instance-attributes
         self.headers["Sec-WebSocket-Key"] = self.sec_websocket_key
         self.headers["Sec-WebSocket-Protocol"] = "chat, superchat"
         self.headers["Sec-WebSocket-Version"] = "13"
+        if self.compression:
+            self.headers[
+                "Sec-WebSocket-Extensions"
+            ] = "permessage-deflate; client_max_window_bits"
         return self.headers
 
     def get_switch_headers(self) -> bytes:
@@ -64,13 +123,80 @@ class ProtocolHandler:  # pylint: disable=too-many-instance-attributes
         init_request += self.get_switch_headers()
         return init_request
 
-    def get_subscription(self) -> bytes:
+    def set_key(self, key: str) -> None:
+        """
+        Use `key` for the next upgrade request and its response check.
+        """
+        self.sec_websocket_key = key
+        self.headers["Sec-WebSocket-Key"] = key
+
+    @staticmethod
+    def new_key() -> str:
+        """
+        Sec-WebSocket-Key: a random 16 bytes nonce, base64 encoded (rfc6455#section-4.1)
+        """
+        return base64.b64encode(os.urandom(16)).decode()
+
+    def check_switch_response(self, data: bytes) -> Dict[str, str]:
+        """
+        Expected confirmation: 101 Switching Protocols, upgraded to websocket
+        and accepting our key (rfc6455#section-4.2.2). Returns the response
+        headers, names lowercased.
+        """
+        head = data.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+        status, *lines = head.split("\r\n")
+        if status.split(" ", 2)[:2] != ["HTTP/1.1", "101"]:
+            raise HandshakeError(f"Switching protocols failed! {status!r}")
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("upgrade", "").lower() != "websocket":
+            raise HandshakeError(
+                "Switching protocols failed! Not upgraded to websocket"
+            )
+        if headers.get("sec-websocket-accept") != websocket_accept(
+            self.sec_websocket_key
+        ):
+            raise HandshakeError(
+                "Switching protocols failed! Wrong Sec-WebSocket-Accept"
+            )
+        return headers
+
+    @staticmethod
+    def get_deflate_params(data: bytes) -> Dict[str, str] or None:
+        """
+        permessage-deflate parameters the server agreed on in its 101
+        response, e.g. {"server_no_context_takeover": ""}, None if it did not.
+        """
+        for line in data.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            if name.strip().lower() != "sec-websocket-extensions":
+                continue
+            for extension in value.split(","):
+                name, *params = [part.strip() for part in extension.split(";")]
+                if name == "permessage-deflate":
+                    return dict(
+                        (param.partition("=")[0], param.partition("=")[2])
+                        for param in params
+                    )
+        return None
+
+    def get_subscription(
+        self, product_ids: List[str] or None = None, kind: str = "subscribe"
+    ) -> bytes:
+        """
+        Subscription frame of all the product_ids, or (un)subscription
+        of just the given ones when kind is "unsubscribe".
+        """
+        if product_ids is None:
+            product_ids = self.product_ids
         params = {
-            "type": "subscribe",
-            "product_ids": self.product_ids,
+            "type": kind,
+            "product_ids": product_ids,
             "channels": [
                 "heartbeat",
-                {"name": self.channel, "product_ids": self.product_ids},
+                {"name": self.channel, "product_ids": product_ids},
             ],
         }
         subscribe = ABNF.create_frame(json.dumps(params), 0x1, fin=1)
@@ -1,4 +1,5 @@
 from coinvwap import Coinvwap
+from supervisor import Supervisor
 
 if __name__ == "__main__":
     cvp = Coinvwap(
@@ -9,5 +10,4 @@ if __name__ == "__main__":
         price_field="price",
         quantity_field="last_size",
     )
-    cvp.connect()
-    cvp.listen(report_fn=print)
+    Supervisor(cvp).listen(report_fn=print)
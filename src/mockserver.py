@@ -0,0 +1,175 @@
+import json
+import logging
+import socket
+import time
+import zlib
+from datetime import datetime, timezone
+from threading import Thread
+from typing import Any, List, Tuple
+
+from handshake import accept_upgrade
+from payload import FrameDecoder, parse_payload
+from subscribe import ABNF
+
+
+class MockCoinbaseServer:  # pylint: disable=too-many-instance-attributes
+    """
+    Local stand-in for the Coinbase websocket feed.
+
+    Completes the HTTP 101 upgrade, reads the subscription and streams
+    synthetic ticker frames for the subscribed product_ids (or `products`
+    generated ones) to every client:
+
+    - rate: frames per second per connection, 0 streams as fast as possible
+    - messages: frames per connection, the connection is closed afterwards
+    - frame_size: pad every ticker payload to at least this many bytes
+    - coalesce: frames joined into one send, like TCP coalescing them
+    - segment: split the sends into segments of at most this many bytes,
+      so frames get fragmented across reads
+    - compress: accept permessage-deflate when offered and send compressed
+      frames, with context takeover
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        rate: float = 0,
+        messages: int = 1000,
+        products: int = 3,
+        frame_size: int = 0,
+        coalesce: int = 1,
+        segment: int = 0,
+        compress: bool = False,
+    ) -> None:
+        self.sock = socket.create_server((host, port))
+        self.sock.settimeout(0.2)
+        self.host, self.port = self.sock.getsockname()[:2]
+        self.options = {
+            "rate": rate,
+            "messages": messages,
+            "frame_size": frame_size,
+            "coalesce": max(coalesce, 1),
+            "segment": segment,
+            "compress": compress,
+        }
+        self.product_ids = [f"P{idx:03d}-USD" for idx in range(products)]
+        self.running = False
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    def start(self) -> "MockCoinbaseServer":
+        self.running = True
+        self.thread = Thread(target=self._accept, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.sock.close()
+
+    def _accept(self) -> None:
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            conn.settimeout(None)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            product_ids, compressor = self._upgrade(conn)
+            self._stream(conn, product_ids, compressor)
+        except OSError as ex:
+            logging.debug("-- Mock client gone: %s --", ex)
+        finally:
+            conn.close()
+
+    def _upgrade(self, conn: socket.socket) -> Tuple[List[str], Any]:
+        extensions = "permessage-deflate" if self.options["compress"] else None
+        headers = accept_upgrade(conn, extensions)
+        compressor = None
+        if extensions and extensions in headers.get("Sec-WebSocket-Extensions", ""):
+            compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+        decoder = FrameDecoder()
+        while True:
+            if not decoder.recv_into(conn):
+                raise ConnectionError("Client closed before subscribing")
+            for opcode, data in decoder.frames():
+                if opcode == ABNF.OPCODE_TEXT:
+                    subscription = parse_payload(data)
+                    product_ids = subscription.get("product_ids") or self.product_ids
+                    return product_ids, compressor
+
+    def ticker(
+        self,
+        sequence: int,
+        product_id: str,
+        compressor=None,
+        trade_id: int or None = None,
+    ) -> bytes:
+        """
+        Synthetic ticker frame, `time` is the moment it gets built.
+        trade_id defaults to the sequence.
+        A compressor deflates it into an RSV1 frame (rfc7692).
+        """
+        payload = {
+            "type": "ticker",
+            "sequence": sequence,
+            "product_id": product_id,
+            "trade_id": sequence if trade_id is None else trade_id,
+            "price": f"{100 + sequence % 1000 / 100:.2f}",
+            "last_size": f"{0.001 * (1 + sequence % 7):.8f}",
+            "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        }
+        data = json.dumps(payload, separators=(",", ":"))
+        if len(data) < self.options["frame_size"]:
+            payload["padding"] = "x" * (self.options["frame_size"] - len(data) - 13)
+            data = json.dumps(payload, separators=(",", ":"))
+        if compressor:
+            deflated = compressor.compress(data.encode())
+            deflated += compressor.flush(zlib.Z_SYNC_FLUSH)
+            # the 00 00 ff ff tail of the sync flush is left out
+            return ABNF(
+                1, 1, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=deflated[:-4]
+            ).format()
+        return ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=data.encode()).format()
+
+    def _stream(
+        self, conn: socket.socket, product_ids: List[str], compressor=None
+    ) -> None:
+        rate, messages = self.options["rate"], self.options["messages"]
+        coalesce, segment = self.options["coalesce"], self.options["segment"]
+        started = time.perf_counter()
+        sent = 0
+        products = len(product_ids)
+        while sent < messages and self.running:
+            batch = min(coalesce, messages - sent)
+            # trade ids are consecutive per product
+            data = b"".join(
+                self.ticker(
+                    sent + idx,
+                    product_ids[(sent + idx) % products],
+                    compressor,
+                    (sent + idx) // products,
+                )
+                for idx in range(batch)
+            )
+            if segment:
+                for carret in range(0, len(data), segment):
+                    conn.sendall(data[carret : carret + segment])
+            else:
+                conn.sendall(data)
+            sent += batch
+            if rate:
+                delay = sent / rate - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
@@ -1,30 +1,261 @@
 import json
-import logging
+import os
+import struct
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Tuple
+
+from subscribe import ABNF
+
+_UNPACK_16 = struct.Struct("!H").unpack_from
+_UNPACK_64 = struct.Struct("!Q").unpack_from
+
+# rfc7692#section-7.2.2: the sender strips this tail off every message
+_DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+# Client frames must be masked, pings with no payload (the usual case)
+# can be answered with the very same bytes every time.
+_PONG_HEADER = bytes((0x80 | ABNF.OPCODE_PONG,))
+_EMPTY_PONG = ABNF.create_frame(b"", ABNF.OPCODE_PONG).format()
+
+
+class ProtocolError(ValueError):
+    """
+    Raised on frames breaking the websocket protocol, the connection
+    cannot be trusted any further.
+    """
+
+
+class FrameDecoder:  # pylint: disable=too-many-instance-attributes
+    """
+    Stateful websocket frame decoder, kept for the lifetime of a connection.
+
+    Socket data is read straight into a preallocated ``bytearray`` with
+    ``recv_into`` (or appended with ``feed``) and ``frames`` yields every
+    complete message as ``(opcode, payload)``. Payloads are ``memoryview``
+    slices of the receive buffer, so they are only valid until the next read.
+    Partial frames stay in the buffer until the rest of them arrives.
+
+    Supports 7, 16 and 64-bit payload lengths (rfc6455#section-5.2),
+    fragmented messages (continuation frames) and control frames
+    interleaved between fragments. Once permessage-deflate is negotiated
+    (see enable_deflate), messages with RSV1 set are inflated.
+    """
+
+    __slots__ = (
+        "buffer",
+        "view",
+        "start",
+        "end",
+        "wanted",
+        "fragments",
+        "opcode",
+        "compressed",
+        "inflater",
+        "context_takeover",
+    )
+
+    # smallest free space worth a recv_into call
+    MIN_READ = 4096
+
+    def __init__(self, buffer_size: int = 65536) -> None:
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        # unconsumed data lives in buffer[start:end]
+        self.start = 0
+        self.end = 0
+        # size of the frame waiting for more data
+        self.wanted = 0
+        # fragmented message being reassembled and its opcode
+        self.fragments = None
+        self.opcode = ABNF.OPCODE_TEXT
+        self.compressed = False
+        # permessage-deflate (rfc7692), off until negotiated
+        self.inflater = None
+        self.context_takeover = True
+
+    def enable_deflate(self, context_takeover: bool = True) -> None:
+        """
+        Inflate the RSV1 messages from now on. With context takeover the
+        server keeps its LZ77 window across messages, so one decompressobj
+        lives for the whole connection.
+        """
+        self.inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.context_takeover = context_takeover
+
+    def _inflate(self, payload) -> memoryview:
+        inflater = self.inflater
+        if inflater is None:
+            raise ProtocolError("Compressed frame without permessage-deflate")
+        try:
+            message = inflater.decompress(payload) + inflater.decompress(_DEFLATE_TAIL)
+        except zlib.error as ex:
+            raise ProtocolError(f"Invalid compressed message: {ex}") from ex
+        if not self.context_takeover:
+            self.inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        return memoryview(message)
+
+    def recv_into(self, sock, nbytes: int = 0) -> int:
+        """
+        Read from the socket into the free space of the buffer.
+        Returns the number of bytes read, 0 means the peer closed.
+        """
+        self._make_room(max(self.wanted - (self.end - self.start), self.MIN_READ))
+        received = sock.recv_into(self.view[self.end :], nbytes)
+        self.end += received
+        return received
+
+    def feed(self, data: bytes) -> None:
+        """
+        Append already received bytes to the buffer.
+        """
+        size = len(data)
+        self._make_room(size)
+        self.view[self.end : self.end + size] = data
+        self.end += size
+
+    def _make_room(self, needed: int) -> None:
+        pending = self.end - self.start
+        if pending == 0:
+            self.start = self.end = 0
+        if len(self.buffer) - self.end >= needed:
+            return
+        capacity = len(self.buffer)
+        while capacity < pending + needed:
+            capacity *= 2
+        if capacity == len(self.buffer):
+            # move the partial frame to the front of the buffer
+            self.buffer[:pending] = bytes(self.view[self.start : self.end])
+        else:
+            # yielded views may still point at the old buffer, never resize it
+            buffer = bytearray(capacity)
+            buffer[:pending] = self.view[self.start : self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        self.start = 0
+        self.end = pending
+
+    def frames(  # pylint: disable=too-many-branches
+        self,
+    ) -> Iterator[Tuple[int, memoryview]]:
+        """
+        Yield all the complete messages available in the buffer.
+        """
+        buffer = self.buffer
+        while True:
+            start = self.start
+            available = self.end - start
+            if available < 2:
+                return
+            length = buffer[start + 1] & 0x7F
+            offset = 2
+            if length == 126:
+                if available < 4:
+                    return
+                length = _UNPACK_16(buffer, start + 2)[0]
+                offset = 4
+            elif length == 127:
+                if available < 10:
+                    return
+                length = _UNPACK_64(buffer, start + 2)[0]
+                offset = 10
+            masked = buffer[start + 1] & 0x80
+            if masked:
+                offset += 4
+            total = offset + length
+            if available < total:
+                self.wanted = total
+                return
+            self.wanted = 0
+            self.start = start + total
+
+            payload = self.view[start + offset : start + total]
+            if masked:
+                mask_key = bytes(self.view[start + offset - 4 : start + offset])
+                payload = memoryview(ABNF.mask(mask_key, bytes(payload)))
+
+            fin = buffer[start] & 0x80
+            opcode = buffer[start] & 0x0F
+            if opcode >= ABNF.OPCODE_CLOSE:
+                # control frames are never fragmented
+                yield opcode, payload
+            elif opcode == ABNF.OPCODE_CONT:
+                if self.fragments is None:
+                    raise ProtocolError("Continuation frame without a message")
+                self.fragments += payload
+                if fin:
+                    message, self.fragments = self.fragments, None
+                    if self.compressed:
+                        yield self.opcode, self._inflate(message)
+                    else:
+                        yield self.opcode, memoryview(message)
+            elif fin:
+                # RSV1 marks a compressed message, on its first frame only
+                if buffer[start] & 0x40:
+                    yield opcode, self._inflate(payload)
+                else:
+                    yield opcode, payload
+            else:
+                self.fragments = bytearray(payload)
+                self.opcode = opcode
+                self.compressed = bool(buffer[start] & 0x40)
+
+
+def pong_frame(data) -> bytes:
+    """
+    Build the masked pong answering a ping with the given payload.
+    """
+    if not data:
+        return _EMPTY_PONG
+    # control frame payloads are at most 125 bytes, one length byte
+    mask_key = os.urandom(4)
+    return (
+        _PONG_HEADER
+        + bytes((0x80 | len(data),))
+        + mask_key
+        + ABNF.mask(mask_key, bytes(data))
+    )
+
+
+def close_frame(data=b"") -> bytes:
+    """
+    Build the masked close frame echoing the status code of the server.
+    """
+    return ABNF.create_frame(bytes(data[:2]), ABNF.OPCODE_CLOSE).format()
+
+
+def parse_payload(data) -> Dict:
+    """
+    Load a text frame payload (bytes or memoryview) as JSON.
+    """
+    return json.loads(str(data, "utf-8"))
+
+
+def parse_time(value: str) -> float:
+    """
+    Exchange timestamp, e.g. "2022-02-17T01:29:30.220661Z", as epoch seconds.
+    """
+    value = value.rstrip("Z")
+    if "." in value:
+        # fromisoformat wants exactly 3 or 6 digits of the fraction
+        head, fraction = value.split(".")
+        value = f"{head}.{fraction[:6]:0<6}"
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
 
 
 def split_frames(recv_fn, recv_buffer=4096):
     """
     Read websocket data and parse the
     frames into well formed JSON sentences.
-    Once the JSON is loaded it yelds the data to
-    the main CoinVWAP listen loop for further processing.
-    """
-    msg = recv_fn(recv_buffer)
-    carret = 0
-    while carret < len(msg):
-        if len(msg) - carret < 4:
-            # Payload too short to make sense, let's read more data
-            # TODO: test cover various partial-frame cases!
-            msg += recv_fn(recv_buffer)
-        # fin, rsv1, rsv2, rsv3, opcode
-        # expected fin=1, rsv*=0, opcode=0x1 (OPCODE_TEXT)
-        if f"{msg[carret]:08b}" == "10000001":
-            length = msg[carret + 2] << 8 | msg[carret + 3]
-            content = msg[carret + 4 : carret + length + 4]
-            try:
-                parsed = json.loads(content)
-                yield parsed
-                carret = carret + 4 + length
-            except json.decoder.JSONDecodeError:
-                logging.debug("Buffer was short, reading in more ..")
-                msg += recv_fn(recv_buffer)
+    It reads until recv_fn returns no more data
+    and yields each parsed text message.
+    """
+    decoder = FrameDecoder()
+    while True:
+        data = recv_fn(recv_buffer)
+        if not data:
+            return
+        decoder.feed(data)
+        for opcode, content in decoder.frames():
+            if opcode == ABNF.OPCODE_TEXT:
+                yield parse_payload(content)
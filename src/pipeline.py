@@ -0,0 +1,171 @@
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List
+
+from coinvwap import Coinvwap
+from payload import ProtocolError
+from subscribe import ABNF
+from vwap import VWAPUpdate
+
+
+class Pipeline:  # pylint: disable=too-many-instance-attributes
+    """
+    Pipelined mode of a Coinvwap: a dedicated I/O thread drains the socket
+    and answers control frames, text payloads are copied into a bounded
+    queue and decoded, stored and reported by the consuming thread. A slow
+    report_fn then delays the VWAPs but no longer the socket reads.
+
+        Pipeline(cvp, queue_size=10000, overflow="drop_oldest").listen(print)
+
+    overflow, once `queue_size` payloads wait:
+    - "block": the I/O thread waits for room (backpressure to the socket)
+    - "drop_oldest": the oldest waiting payloads are dropped
+    - "drop_newest": the incoming payloads are dropped
+
+    With the client's stats, recv and decode are timed by the I/O thread,
+    parse and store by the consuming one. A ProtocolError of the I/O thread
+    disconnects and is raised by updates() once the queue is drained.
+    """
+
+    def __init__(
+        self, cvp: Coinvwap, queue_size: int = 10000, overflow: str = "block"
+    ) -> None:
+        if overflow not in ("block", "drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown overflow policy {overflow}")
+        self.cvp = cvp
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.frames = deque(maxlen=queue_size if overflow == "drop_oldest" else None)
+        self.ready = threading.Condition()
+        self.reader = None
+        self.done = False
+        # ProtocolError of the I/O thread, raised by the consuming one
+        self.error = None
+        self.received = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "depth": len(self.frames),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+    def _put(self, payloads: List[bytes]) -> None:
+        if not payloads:
+            return
+        with self.ready:
+            self.received += len(payloads)
+            frames = self.frames
+            if self.overflow == "block":
+                while len(frames) + len(payloads) > self.queue_size:
+                    room = self.queue_size - len(frames)
+                    if room > 0:
+                        frames.extend(payloads[:room])
+                        payloads = payloads[room:]
+                        self.max_depth = max(self.max_depth, len(frames))
+                        self.ready.notify_all()
+                    if not self.cvp.connected:
+                        return
+                    self.ready.wait()
+            elif self.overflow == "drop_newest":
+                room = max(self.queue_size - len(frames), 0)
+                self.dropped += max(len(payloads) - room, 0)
+                payloads = payloads[:room]
+            else:
+                self.dropped += max(len(frames) + len(payloads) - self.queue_size, 0)
+            frames.extend(payloads)
+            self.max_depth = max(self.max_depth, len(frames))
+            self.ready.notify_all()
+
+    def _read(self) -> None:
+        """
+        I/O thread: socket -> frames -> queue, control frames answered here.
+        """
+        cvp = self.cvp
+        decoder, stats, clock = cvp.decoder, cvp.stats, time.perf_counter_ns
+        # pylint: disable=protected-access
+        payloads = []
+        try:
+            while cvp.connected:
+                payloads.clear()
+                started = cvp._read_started()
+                received = decoder.recv_into(cvp.sock)
+                mark = cvp._read_done(started)
+                if not received:
+                    cvp._closed_by_server()
+                    break
+                for opcode, data in decoder.frames():
+                    if stats:
+                        started, mark = mark, clock()
+                        stats.record("decode", mark - started)
+                    if opcode == ABNF.OPCODE_TEXT:
+                        payloads.append(bytes(data))
+                    elif not cvp._control(opcode, data):
+                        break
+                self._put(payloads)
+        except OSError as ex:
+            if cvp.connected:
+                logging.warning("-- Connection failed: %s --", ex)
+                cvp.connected = False
+        except ProtocolError as ex:
+            logging.warning("-- Protocol error: %s --", ex)
+            # the payloads decoded before the faulty frame are still valid
+            self._put(payloads)
+            cvp.connected = False
+            self.error = ex
+        finally:
+            with self.ready:
+                self.done = True
+                self.ready.notify_all()
+
+    def updates(self) -> Iterator[VWAPUpdate]:
+        """
+        Subscribe, start the I/O thread and yield the updates
+        of the queued payloads.
+        """
+        cvp = self.cvp
+        cvp.subscribe()
+        self.done = False
+        self.error = None
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+        try:
+            while True:
+                with self.ready:
+                    while not self.frames and not self.done:
+                        self.ready.wait()
+                    if not self.frames:
+                        if self.error:
+                            raise self.error
+                        break
+                    batch = list(self.frames)
+                    self.frames.clear()
+                    self.ready.notify_all()
+                if cvp.removals:
+                    cvp.apply_removals()
+                # decoded (and timed) by the I/O thread already
+                yield from cvp.frame_updates((ABNF.OPCODE_TEXT, data) for data in batch)
+        finally:
+            self.stop()
+
+    def listen(self, report_fn=None, sinks=()) -> None:
+        self.cvp.consume(self.updates(), report_fn, sinks)
+
+    def stop(self) -> None:
+        cvp = self.cvp
+        if cvp.connected:
+            cvp.disconnect()
+            try:
+                cvp.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        with self.ready:
+            self.ready.notify_all()
+        if self.reader and self.reader is not threading.current_thread():
+            self.reader.join()
@@ -0,0 +1,149 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from fixedpoint import FixedPointRingBuffer
+from ringbuffer import RingBuffer
+from vwap import VWAPStore
+
+
+class WindowSummary(NamedTuple):
+    """
+    What is left of an evicted window: the running sums and point count
+    of every horizon, enough to keep reporting its last VWAP.
+    """
+
+    sums_pq: Tuple[float, ...]
+    sums_q: Tuple[float, ...]
+    counts: Tuple[int, ...]
+
+    def vwap(self, idx: int = 0) -> float:
+        if not self.sums_q[idx]:
+            return 0.0
+        return self.sums_pq[idx] / self.sums_q[idx]
+
+    def points(self, idx: int = 0) -> int:
+        return self.counts[idx]
+
+
+class LazyVWAPStore(VWAPStore):  # pylint: disable=too-many-instance-attributes
+    """
+    VWAPStore for large product universes where most pairs trade rarely.
+
+    Windows are allocated on the first tick of a product instead of upfront
+    and kept in least recently updated order. Once `max_windows` windows
+    exist (each costs 16 bytes per point of the longest horizon), the least
+    recently updated one is evicted; windows not updated for `idle_seconds`
+    are evicted too. An evicted window leaves a WindowSummary behind, so
+    its last VWAP is still reported, and starts over on its next tick.
+
+    Counters: `allocated` windows, `evicted` windows and `dropped` payloads
+    of products outside product_ids.
+    """
+
+    def __init__(
+        self,
+        product_ids: List[str],
+        *args,
+        max_windows: int or None = None,
+        idle_seconds: float or None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__([], *args, **kwargs)
+        self.product_ids = list(product_ids)
+        self.followed = set(self.product_ids)
+        self.times = dict.fromkeys(self.product_ids)
+        self.prices_n_vols: Dict[str, RingBuffer] = OrderedDict()
+        self.touched: Dict[str, float] = {}
+        self.summaries: Dict[str, WindowSummary] = {}
+        self.max_windows = max_windows
+        self.idle_seconds = idle_seconds
+        self.allocated = 0
+        self.evicted = 0
+        horizons = len(self.horizons)
+        self.empty = WindowSummary(
+            (0.0,) * horizons, (0.0,) * horizons, (0,) * horizons
+        )
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "windows": len(self.prices_n_vols),
+            "summaries": len(self.summaries),
+            "allocated": self.allocated,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+        }
+
+    def get_window(self, product_id: str) -> Optional[RingBuffer]:
+        window = self.prices_n_vols.get(product_id)
+        if window is None and product_id in self.followed:
+            if self.max_windows and len(self.prices_n_vols) >= self.max_windows:
+                self.evict(next(iter(self.prices_n_vols)))
+            window = self.prices_n_vols[product_id] = self.new_window(product_id)
+            self.summaries.pop(product_id, None)
+            self.allocated += 1
+            if self.idle_seconds is not None:
+                # allocated without a tick too, e.g. restored from a snapshot
+                self.touched[product_id] = time.monotonic()
+        return window
+
+    def evict(self, product_id: str) -> None:
+        window = self.prices_n_vols.pop(product_id)
+        self.touched.pop(product_id, None)
+        if isinstance(window, FixedPointRingBuffer):
+            window = window.as_float()
+        self.summaries[product_id] = WindowSummary(
+            tuple(window.sums_pq),
+            tuple(window.sums_q),
+            tuple(window.points(idx) for idx in range(len(self.horizons))),
+        )
+        self.evicted += 1
+
+    def _put(self, product_id: str, price: float, last_size: float) -> bool:
+        window = self.prices_n_vols.get(product_id)
+        if window is None:
+            window = self.get_window(product_id)
+            if window is None:
+                self.dropped += 1
+                return False
+        else:
+            self.prices_n_vols.move_to_end(product_id)
+        window.append(price, last_size)
+        if self.idle_seconds is not None:
+            now = time.monotonic()
+            self.touched[product_id] = now
+            # the least recently updated windows come first, this one last
+            oldest = next(iter(self.prices_n_vols))
+            while now - self.touched[oldest] > self.idle_seconds:
+                self.evict(oldest)
+                oldest = next(iter(self.prices_n_vols))
+        return True
+
+    def follows(self, product_id: str) -> bool:
+        return product_id in self.followed
+
+    def _add(self, product_id: str) -> None:
+        # the window comes with the first tick
+        self.followed.add(product_id)
+
+    def _remove(self, product_id: str) -> None:
+        self.followed.discard(product_id)
+        self.prices_n_vols.pop(product_id, None)
+        self.summaries.pop(product_id, None)
+        self.touched.pop(product_id, None)
+
+    def _state(self, product_id: str):
+        """
+        Live window, summary of the evicted one, or an empty summary
+        before any tick.
+        """
+        return (
+            self.prices_n_vols.get(product_id)
+            or self.summaries.get(product_id)
+            or self.empty
+        )
+
+    def _states(self) -> List[Tuple[str, RingBuffer]]:
+        return [
+            (product_id, self._state(product_id)) for product_id in self.product_ids
+        ]
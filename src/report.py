@@ -0,0 +1,92 @@
+import io
+import sys
+import threading
+from typing import Dict
+
+from vwap import VWAPUpdate, report_line
+
+
+class Reporter:  # pylint: disable=too-many-instance-attributes
+    """
+    Reporting stage between the VWAP updates and a binary output.
+
+    Updates are conflated per product (the latest value wins) and flushed
+    as preformatted bytes through a buffered binary sink:
+
+    - changed_only: write only the products updated since the last flush,
+      otherwise the full store report
+    - every_messages: flush after this many updates (1 = every update)
+    - every_ms: flush every X milliseconds from a timer thread instead,
+      whatever the update rate is
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        store,
+        output=None,
+        changed_only: bool = True,
+        every_messages: int = 1,
+        every_ms: float = 0,
+        buffer_size: int = 1 << 16,
+    ) -> None:
+        self.store = store
+        if output is None:
+            output = sys.stdout.buffer
+        if not isinstance(output, io.BufferedIOBase):
+            output = io.BufferedWriter(output, buffer_size)
+        self.output = output
+        self.changed_only = changed_only
+        self.every_messages = every_messages if not every_ms else 0
+        self.pending: Dict[str, VWAPUpdate] = {}
+        self.messages = 0
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.timer = None
+        if every_ms:
+            self.timer = threading.Thread(
+                target=self._flush_every, args=(every_ms / 1000,), daemon=True
+            )
+            self.timer.start()
+
+    def publish(self, update: VWAPUpdate) -> None:
+        with self.lock:
+            self.pending[update.product_id] = update
+            self.messages += 1
+            if self.messages < self.every_messages or not self.every_messages:
+                return
+        self.flush()
+
+    def format(self, update: VWAPUpdate) -> bytes:
+        """
+        The update's line of the store report with point counts.
+        """
+        return report_line(
+            update.product_id,
+            update.vwaps or (update.vwap,),
+            update.counts or (update.points,),
+        ).encode()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.messages = 0
+        if not pending:
+            return
+        if self.changed_only:
+            data = b"".join(self.format(update) for update in pending.values())
+        else:
+            data = self.store.report(point_counts=True).encode()
+        with self.write_lock:
+            self.output.write(data)
+            self.output.flush()
+
+    def _flush_every(self, interval: float) -> None:
+        while not self.stopped.wait(interval):
+            self.flush()
+
+    def close(self) -> None:
+        self.stopped.set()
+        if self.timer:
+            self.timer.join()
+        self.flush()
@@ -0,0 +1,109 @@
+from array import array
+from typing import Iterator, Sequence, Tuple
+
+
+class RingBuffer:  # pylint: disable=too-many-instance-attributes
+    """
+    Fixed size window of (price, volume) data points.
+
+    Both columns live in preallocated ``array('d')`` buffers written at
+    a rotating head index, so a data point costs 16 bytes and no Python
+    objects. Running sums of price * volume and volume are kept along the
+    way, which makes both ``append`` and ``vwap`` O(1).
+
+    Several horizons (e.g. the last 50, 200 and 1000 points) can share
+    one buffer sized for the longest of them, each horizon keeps its own
+    running sums and drops the point that falls off its own end.
+    """
+
+    __slots__ = (
+        "horizons",
+        "size",
+        "prices",
+        "vols",
+        "head",
+        "count",
+        "sums_pq",
+        "sums_q",
+        "laps",
+    )
+
+    # Recompute the running sums from scratch once the window has rotated
+    # this many times, to keep floating point drift bounded.
+    REANCHOR_ROTATIONS = 16
+
+    def __init__(self, horizons: int or Sequence[int] = 200) -> None:
+        if isinstance(horizons, int):
+            horizons = (horizons,)
+        if not horizons or min(horizons) < 1:
+            raise ValueError("RingBuffer size must be positive")
+        self.horizons = tuple(horizons)
+        self.size = max(self.horizons)
+        self.prices = array("d", bytes(8 * self.size))
+        self.vols = array("d", bytes(8 * self.size))
+        self.head = 0
+        self.count = 0
+        self.sums_pq = [0.0] * len(self.horizons)
+        self.sums_q = [0.0] * len(self.horizons)
+        self.laps = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        """
+        Iterate over the data points, the oldest first.
+        """
+        return self.last(self.count)
+
+    def last(self, points: int) -> Iterator[Tuple[float, float]]:
+        """
+        Iterate over the newest `points` data points, the oldest first.
+        """
+        points = min(points, self.count)
+        start = (self.head - points) % self.size
+        for offset in range(points):
+            idx = (start + offset) % self.size
+            yield self.prices[idx], self.vols[idx]
+
+    def append(self, price: float, vol: float) -> None:
+        head, size = self.head, self.size
+        prices, vols = self.prices, self.vols
+        sums_pq, sums_q = self.sums_pq, self.sums_q
+        for idx, horizon in enumerate(self.horizons):
+            if self.count >= horizon:
+                # the oldest point of this horizon falls off now
+                old = (head - horizon) % size
+                sums_pq[idx] -= prices[old] * vols[old]
+                sums_q[idx] -= vols[old]
+            sums_pq[idx] += price * vol
+            sums_q[idx] += vol
+        if self.count < size:
+            self.count += 1
+        prices[head] = price
+        vols[head] = vol
+        head += 1
+        if head == size:
+            head = 0
+            self.laps += 1
+        self.head = head
+        # after moving the head, reanchor() sums the newest points from it
+        if not head and self.laps >= self.REANCHOR_ROTATIONS:
+            self.reanchor()
+
+    def reanchor(self) -> None:
+        """
+        Recompute the running sums from the data points in the window.
+        """
+        for idx, horizon in enumerate(self.horizons):
+            self.sums_pq[idx] = sum(price * vol for price, vol in self.last(horizon))
+            self.sums_q[idx] = sum(vol for _, vol in self.last(horizon))
+        self.laps = 0
+
+    def points(self, idx: int = 0) -> int:
+        return min(self.count, self.horizons[idx])
+
+    def vwap(self, idx: int = 0) -> float:
+        if self.count == 0 or self.sums_q[idx] == 0.0:
+            return 0.0
+        return self.sums_pq[idx] / self.sums_q[idx]
@@ -0,0 +1,94 @@
+import logging
+import multiprocessing
+import os
+import queue
+from typing import Dict, Iterator, List
+
+from coinvwap import Coinvwap
+from vwap import VWAPUpdate
+
+
+def split_products(product_ids: List[str], shards: int) -> List[List[str]]:
+    """
+    Deal product_ids round robin into at most `shards` non-empty groups.
+    """
+    groups = [product_ids[idx::shards] for idx in range(shards)]
+    return [group for group in groups if group]
+
+
+def run_shard(product_ids: List[str], options: Dict, updates) -> None:
+    """
+    Worker process: its own connection, subscription and VWAPStore.
+    Every VWAPUpdate goes to the shared `updates` queue, a final None
+    tells the runner the shard is done.
+    """
+    try:
+        cvp = Coinvwap(product_ids=product_ids, **options)
+        cvp.connect()
+        for update in cvp.updates():
+            updates.put(update)
+    except Exception:  # pylint: disable=broad-except
+        logging.exception("-- Shard %s failed --", product_ids)
+    finally:
+        updates.put(None)
+
+
+class ShardedCoinvwap:
+    """
+    Splits product_ids across N connections, each one in its own process,
+    so parsing and JSON decoding scale with cores.
+    All the shards feed one queue, merging the per-product updates into
+    a single stream ordered by arrival.
+    Other keyword arguments are passed to every Coinvwap.
+    """
+
+    def __init__(
+        self, product_ids: List[str], shards: int or None = None, **options
+    ) -> None:
+        self.groups = split_products(product_ids, shards or os.cpu_count() or 1)
+        self.options = options
+        self.context = multiprocessing.get_context()
+        self.queue = self.context.Queue()
+        self.processes = []
+        self.latest = {}
+
+    def start(self) -> None:
+        for group in self.groups:
+            process = self.context.Process(
+                target=run_shard,
+                args=(group, self.options, self.queue),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def updates(self) -> Iterator[VWAPUpdate]:
+        """
+        Yield the merged updates of all the shards until every shard is done.
+        """
+        if not self.processes:
+            self.start()
+        running = len(self.processes)
+        while running:
+            try:
+                update = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                if not any(process.is_alive() for process in self.processes):
+                    # shards killed without their final None
+                    break
+                continue
+            if update is None:
+                running -= 1
+                continue
+            self.latest[update.product_id] = update
+            yield update
+
+    def __iter__(self) -> Iterator[VWAPUpdate]:
+        return self.updates()
+
+    def stop(self) -> None:
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.join()
+        self.processes = []
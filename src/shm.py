@@ -0,0 +1,144 @@
+"""
+Latest VWAP table in shared memory, for other processes on the same host.
+
+Layout: a 16 bytes header (magic, slot count) and one 64 bytes slot per
+product: seqlock counter, VWAP, point count, update sequence number,
+timestamp and the product_id. The publisher makes the counter odd while
+it writes a slot and even again once done, readers retry whenever the
+counter was odd or changed under them, so reads never take a lock.
+"""
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, NamedTuple
+
+from payload import parse_time
+from vwap import VWAPUpdate
+
+MAGIC = b"CVWAPSHM"
+HEADER = struct.Struct("<8sI4x")
+COUNTER = struct.Struct("<Q")
+VALUES = struct.Struct("<dQQd")
+NAME = struct.Struct("<24s")
+SLOT_SIZE = COUNTER.size + VALUES.size + NAME.size
+
+
+class SharedVWAP(NamedTuple):
+    product_id: str
+    vwap: float
+    points: int
+    sequence: int
+    # exchange time of the data point (or publish time), epoch seconds
+    timestamp: float
+
+
+class SharedVWAPTable:
+    """
+    Publisher side, a Coinvwap.listen sink:
+
+        table = SharedVWAPTable("coinvwap", cvp.product_ids)
+        cvp.listen(sinks=[table])
+    """
+
+    def __init__(self, name: str, product_ids: List[str], capacity: int = 0) -> None:
+        capacity = max(capacity, len(product_ids))
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER.size + capacity * SLOT_SIZE
+        )
+        self.buf = self.shm.buf
+        HEADER.pack_into(self.buf, 0, MAGIC, capacity)
+        self.capacity = capacity
+        self.slots: Dict[str, int] = {}
+        self.sequences: Dict[str, int] = {}
+        for product_id in product_ids:
+            self.add(product_id)
+
+    def add(self, product_id: str) -> int:
+        """
+        Allocate the slot of a product, returns its offset.
+        """
+        if product_id in self.slots:
+            return self.slots[product_id]
+        if len(self.slots) >= self.capacity:
+            raise ValueError("Shared VWAP table is full")
+        offset = HEADER.size + len(self.slots) * SLOT_SIZE
+        NAME.pack_into(
+            self.buf, offset + COUNTER.size + VALUES.size, product_id.encode()
+        )
+        self.slots[product_id] = offset
+        self.sequences[product_id] = 0
+        return offset
+
+    def publish(self, update: VWAPUpdate) -> None:
+        offset = self.slots.get(update.product_id)
+        if offset is None:
+            offset = self.add(update.product_id)
+        sequence = self.sequences[update.product_id] + 1
+        self.sequences[update.product_id] = sequence
+        timestamp = parse_time(update.time) if update.time else time.time()
+
+        buf = self.buf
+        counter = COUNTER.unpack_from(buf, offset)[0]
+        COUNTER.pack_into(buf, offset, counter + 1)
+        VALUES.pack_into(
+            buf, offset + COUNTER.size, update.vwap, update.points, sequence, timestamp
+        )
+        COUNTER.pack_into(buf, offset, counter + 2)
+
+    def close(self) -> None:
+        self.buf = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        self.shm.unlink()
+
+
+class SharedVWAPReader:
+    """
+    Reader side, lock-free reads of the latest values from another process.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.shm = shared_memory.SharedMemory(name=name)
+        # only the publisher owns the segment, see bpo-39959
+        resource_tracker.unregister(
+            self.shm._name, "shared_memory"  # pylint: disable=protected-access
+        )
+        self.buf = self.shm.buf
+        magic, self.capacity = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{name} is not a shared VWAP table")
+        self.slots: Dict[str, int] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Pick up the products added by the publisher since the last call.
+        """
+        for idx in range(len(self.slots), self.capacity):
+            offset = HEADER.size + idx * SLOT_SIZE
+            raw = NAME.unpack_from(self.buf, offset + COUNTER.size + VALUES.size)[0]
+            product_id = raw.rstrip(b"\0").decode()
+            if not product_id:
+                break
+            self.slots[product_id] = offset
+
+    def read(self, product_id: str) -> SharedVWAP:
+        offset = self.slots[product_id]
+        buf = self.buf
+        while True:
+            before = COUNTER.unpack_from(buf, offset)[0]
+            if before & 1:
+                # the publisher is writing this slot
+                continue
+            values = VALUES.unpack_from(buf, offset + COUNTER.size)
+            if COUNTER.unpack_from(buf, offset)[0] == before:
+                return SharedVWAP(product_id, *values)
+
+    def read_all(self) -> List[SharedVWAP]:
+        return [self.read(product_id) for product_id in self.slots]
+
+    def close(self) -> None:
+        self.buf = None
+        self.shm.close()
@@ -0,0 +1,223 @@
+"""
+Binary snapshots of the VWAPStore windows, for warm restarts.
+
+A snapshot file starts with a header (MAGIC, entry count, write time) and
+has one entry per product: a fixed (name length, horizon count, buffer
+size, head, count, laps, update time) header, the product_id, the
+horizons, the running sums of every horizon and the raw price and volume
+columns of the RingBuffer. Everything is little-endian. Fixed-point
+windows are saved as floats.
+
+Snapshots are written to a temporary file and moved over the previous
+one with os.replace, so a crash mid-write never leaves a torn snapshot.
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+from fixedpoint import FixedPointRingBuffer
+from payload import parse_time
+from ringbuffer import RingBuffer
+
+MAGIC = b"CVWAPSNP"
+HEADER = struct.Struct("<8sId")
+ENTRY = struct.Struct("<HHIIIId")
+
+
+def _column(values: array) -> bytes:
+    if sys.byteorder == "big":  # pragma: no cover
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _load_column(data) -> array:
+    values = array("d")
+    values.frombytes(data)
+    if sys.byteorder == "big":  # pragma: no cover
+        values.byteswap()
+    return values
+
+
+def _check_window(window) -> None:
+    if not isinstance(window, RingBuffer):
+        name = type(window).__name__
+        raise TypeError(f"Snapshots hold RingBuffer windows only, not {name}")
+
+
+def _entries(store) -> Tuple[float, List[bytes]]:
+    """
+    Serialization time and entries of every product window holding data points.
+    """
+    written = time.time()
+    entries = []
+    for product_id, window in store.prices_n_vols.items():
+        _check_window(window)
+        if not window.count:
+            continue
+        if isinstance(window, FixedPointRingBuffer):
+            window = window.as_float()
+        stamp = store.times.get(product_id)
+        updated = parse_time(stamp) if stamp else written
+        name = product_id.encode()
+        horizons = len(window.horizons)
+        entries.append(
+            ENTRY.pack(
+                len(name),
+                horizons,
+                window.size,
+                window.head,
+                window.count,
+                window.laps,
+                updated,
+            )
+            + name
+            + struct.pack(f"<{horizons}I", *window.horizons)
+            + struct.pack(f"<{horizons * 2}d", *window.sums_pq, *window.sums_q)
+            + _column(window.prices)
+            + _column(window.vols)
+        )
+    return written, entries
+
+
+def _write_file(path: str, written: float, entries: List[bytes]) -> None:
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, len(entries), written))
+        snapshot.writelines(entries)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temporary, path)
+
+
+def write_snapshot(store, path: str) -> int:
+    """
+    Checkpoint every product window holding data points,
+    returns the number of entries written.
+    """
+    written, entries = _entries(store)
+    _write_file(path, written, entries)
+    return len(entries)
+
+
+def _read_entry(data, carret: int):
+    """
+    Entry at `carret` as (product_id, update time, saved RingBuffer, next carret).
+    """
+    fields = ENTRY.unpack_from(data, carret)
+    name_length, horizons, size = fields[:3]
+    carret += ENTRY.size
+    product_id = data[carret : carret + name_length].decode()
+    carret += name_length
+    saved = RingBuffer(struct.unpack_from(f"<{horizons}I", data, carret))
+    carret += 4 * horizons
+    sums = struct.unpack_from(f"<{horizons * 2}d", data, carret)
+    carret += 16 * horizons
+    saved.sums_pq, saved.sums_q = list(sums[:horizons]), list(sums[horizons:])
+    saved.prices = _load_column(data[carret : carret + 8 * size])
+    carret += 8 * size
+    saved.vols = _load_column(data[carret : carret + 8 * size])
+    carret += 8 * size
+    saved.head, saved.count, saved.laps = fields[3:6]
+    return product_id, fields[6], saved, carret
+
+
+def restore_snapshot(store, path: str, max_age: float or None = None) -> int:
+    """
+    Load the windows of a snapshot back into the store, skipping the
+    products the store does not track and the entries whose last update
+    is older than max_age seconds. Returns the number of restored products.
+
+    A window saved with the same horizons is restored as it was, running
+    sums included, otherwise its data points are appended again (always
+    for fixed-point windows, which rescale them).
+    """
+    if not os.path.exists(path) or not os.path.getsize(path):
+        return 0
+    oldest = time.time() - max_age if max_age is not None else None
+    restored = 0
+    with open(path, "rb") as snapshot:
+        with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic, entries, _ = HEADER.unpack_from(data, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a VWAP snapshot")
+            carret = HEADER.size
+            for _ in range(entries):
+                product_id, updated, saved, carret = _read_entry(data, carret)
+                if oldest is not None and updated < oldest:
+                    continue
+                window = store.get_window(product_id)
+                if window is None:
+                    continue
+                _check_window(window)
+                if isinstance(window, FixedPointRingBuffer):
+                    for point in saved:
+                        window.append(*window.from_float(*point))
+                elif window.horizons == saved.horizons:
+                    store.prices_n_vols[product_id] = saved
+                else:
+                    for point in saved:
+                        window.append(*point)
+                store.times[product_id] = datetime.fromtimestamp(
+                    updated, timezone.utc
+                ).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+                restored += 1
+    return restored
+
+
+class SnapshotSink:
+    """
+    Coinvwap.listen sink checkpointing the store every `every` seconds
+    (checked on each update) and once more on close.
+
+    The windows are serialized by the thread updating the store, which
+    keeps the snapshot consistent and costs a copy of the windows; the
+    file write and fsync run in a background thread so they never stall
+    the ingestion. A checkpoint due while the previous one is still being
+    written waits for the next update.
+    """
+
+    def __init__(self, store, path: str, every: float = 30.0) -> None:
+        self.store = store
+        self.path = path
+        self.every = every
+        self.last = time.monotonic()
+        self.snapshots = 0
+        self.writer = None
+
+    def publish(self, update) -> None:  # pylint: disable=unused-argument
+        if time.monotonic() - self.last >= self.every:
+            if self.writer is None or not self.writer.is_alive():
+                self.checkpoint(background=True)
+
+    def checkpoint(self, background: bool = False) -> int:
+        written, entries = _entries(self.store)
+        self.last = time.monotonic()
+        if background:
+            self.writer = threading.Thread(
+                target=self._write, args=(written, entries), daemon=True
+            )
+            self.writer.start()
+        else:
+            self._write(written, entries)
+        return len(entries)
+
+    def _write(self, written: float, entries: List[bytes]) -> None:
+        try:
+            _write_file(self.path, written, entries)
+        except OSError as ex:
+            logging.warning("-- Snapshot of %s failed: %s --", self.path, ex)
+            return
+        self.snapshots += 1
+
+    def close(self) -> None:
+        if self.writer:
+            self.writer.join()
+        self.checkpoint()
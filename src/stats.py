@@ -0,0 +1,179 @@
+"""
+Per-stage latency histograms and per-product throughput counters.
+
+Stages: socket recv, frame decode, payload parse, VWAPStore.store (+ the
+update), report (sinks and report_fn), plus the "exchange" latency from the
+ticker `time` to the moment it got reported. The blocking, asyncio and
+pipelined clients share the timed frame loop (Coinvwap.frame_updates);
+report and exchange are timed by listen(), which the asyncio client lacks.
+Instrumentation is off unless a Stats instance is given to the client.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+STAGES = ("recv", "decode", "parse", "store", "report", "exchange")
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    """
+    HDR-style log-linear histogram of nanosecond values: every power of two
+    is split into 2**SUB_BITS buckets, so any recorded value is known within
+    1 / 2**SUB_BITS (~6%), whatever its magnitude, in a fixed small memory.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    SUB_BITS = 4
+    # values up to 2**63 ns
+    BUCKETS = (64 - SUB_BITS) << SUB_BITS
+
+    def __init__(self) -> None:
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def index(cls, value: int) -> int:
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        if shift <= 0:
+            return value
+        return (shift << cls.SUB_BITS) + (value >> shift)
+
+    @classmethod
+    def highest(cls, index: int) -> int:
+        """
+        Highest value falling into the bucket `index`.
+        """
+        shift = (index >> cls.SUB_BITS) - 1
+        if shift <= 0:
+            return index
+        return ((index - (shift << cls.SUB_BITS) + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        value = max(value, 0)
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(int(self.count * fraction + 0.5), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.highest(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000 if self.count else 0.0,
+            "max_us": self.max / 1000,
+            **{f"p{q * 100:g}_us": self.percentile(q) / 1000 for q in QUANTILES},
+        }
+
+
+class Stats:
+    """
+    Instrumentation surface of a client, Coinvwap(..., stats=Stats()):
+
+        stats.snapshot()          # dict of every stage and product
+        stats.prometheus()        # the same, Prometheus text format
+        stats.serve(port=9108)    # GET /metrics from a local HTTP thread
+    """
+
+    def __init__(self) -> None:
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.messages: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+        self.started = time.monotonic()
+        self.server = None
+
+    def record(self, stage: str, nanoseconds: int) -> None:
+        self.stages[stage].record(nanoseconds)
+
+    def count(self, product_id: str, size: int) -> None:
+        self.messages[product_id] = self.messages.get(product_id, 0) + 1
+        self.bytes[product_id] = self.bytes.get(product_id, 0) + size
+
+    def snapshot(self) -> Dict:
+        elapsed = time.monotonic() - self.started
+        return {
+            "seconds": elapsed,
+            "stages": {
+                stage: histogram.summary() for stage, histogram in self.stages.items()
+            },
+            "products": {
+                product_id: {
+                    "messages": messages,
+                    "bytes": self.bytes[product_id],
+                    "msgs_per_sec": messages / elapsed if elapsed else 0.0,
+                    "bytes_per_sec": self.bytes[product_id] / elapsed
+                    if elapsed
+                    else 0.0,
+                }
+                for product_id, messages in list(self.messages.items())
+            },
+        }
+
+    def prometheus(self) -> str:
+        lines: List[str] = [
+            "# TYPE coinvwap_stage_seconds summary",
+        ]
+        for stage, histogram in self.stages.items():
+            label = f'stage="{stage}"'
+            for quantile in QUANTILES:
+                value = histogram.percentile(quantile) / 1e9
+                lines.append(
+                    f'coinvwap_stage_seconds{{{label},quantile="{quantile}"}} {value}'
+                )
+            lines.append(
+                f"coinvwap_stage_seconds_sum{{{label}}} {histogram.total / 1e9}"
+            )
+            lines.append(f"coinvwap_stage_seconds_count{{{label}}} {histogram.count}")
+        for name, counters in (("messages", self.messages), ("bytes", self.bytes)):
+            lines.append(f"# TYPE coinvwap_product_{name}_total counter")
+            for product_id, value in list(counters.items()):
+                lines.append(
+                    f'coinvwap_product_{name}_total{{product_id="{product_id}"}} {value}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9108) -> ThreadingHTTPServer:
+        """
+        Serve prometheus() on http://host:port/metrics from a daemon thread.
+        """
+        stats = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = stats.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def close(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,163 @@
+import logging
+import random
+import socket
+import time
+from typing import Dict, Iterator
+
+from coinvwap import Coinvwap
+from handshake import HandshakeError
+from payload import ProtocolError
+from vwap import VWAPUpdate
+
+
+class SequenceTracker:
+    """
+    Follows the `trade_id` of every product's ticker and counts the gaps:
+    `gaps` is the number of jumps, `missed` the trades they skipped.
+    Older or repeated ids (late or replayed messages) only count as
+    `stale`, they do not move the last seen id back.
+
+    The ticker `sequence` is not a per-product counter (it numbers every
+    message of the product's order book, most of which the ticker channel
+    never sends) and cannot reveal gaps, trade ids are consecutive.
+    """
+
+    def __init__(self, type_field: str = "ticker", field: str = "trade_id") -> None:
+        self.type_field = type_field
+        self.field = field
+        self.last: Dict[str, int] = {}
+        self.gaps: Dict[str, int] = {}
+        self.missed: Dict[str, int] = {}
+        self.stale: Dict[str, int] = {}
+
+    def check(self, payload: Dict) -> None:
+        if payload.get("type") != self.type_field:
+            return
+        sequence = payload.get(self.field)
+        if sequence is None:
+            return
+        sequence = int(sequence)
+        product_id = payload.get("product_id")
+        last = self.last.get(product_id)
+        if last is not None:
+            if sequence <= last:
+                self.stale[product_id] = self.stale.get(product_id, 0) + 1
+                return
+            if sequence > last + 1:
+                self.gaps[product_id] = self.gaps.get(product_id, 0) + 1
+                self.missed[product_id] = (
+                    self.missed.get(product_id, 0) + sequence - last - 1
+                )
+                logging.warning(
+                    "-- %s sequence gap: %d -> %d --", product_id, last, sequence
+                )
+        self.last[product_id] = sequence
+
+    def report(self) -> str:
+        return "".join(
+            f"{product_id}\tgaps:\t{gaps}\tmissed:\t{self.missed[product_id]}\n"
+            for product_id, gaps in self.gaps.items()
+        )
+
+
+class Supervisor:  # pylint: disable=too-many-instance-attributes
+    """
+    Keeps a Coinvwap connected: whenever the connection fails or drops,
+    it connects again after an exponential backoff with full jitter
+    (a random delay up to backoff * 2**attempt, capped at max_backoff)
+    and resubscribes. The same VWAPStore is kept, so the windows stay warm
+    across reconnects. Sequence gaps (including the ones a disconnect
+    caused) are counted by `tracker`. A connection breaking the websocket
+    protocol (ProtocolError) is dropped and reconnected too.
+
+        Supervisor(Coinvwap()).listen(report_fn=print)
+
+    max_retries bounds the consecutive failed attempts, None retries forever.
+    """
+
+    def __init__(
+        self,
+        cvp: Coinvwap,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        max_retries: int or None = None,
+    ) -> None:
+        self.cvp = cvp
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.tracker = SequenceTracker(cvp.vwap.type_field)
+        self.reconnects = 0
+        self.running = False
+
+        decode, check = cvp.decode, self.tracker.check
+
+        def checked_decode(data) -> Dict:
+            payload = decode(data)
+            check(payload)
+            return payload
+
+        cvp.decode = checked_decode
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def updates(self) -> Iterator[VWAPUpdate]:
+        """
+        Yield the updates of every connection, until stop() is called
+        or max_retries attempts in a row failed.
+        """
+        self.running = True
+        attempt = 0
+        while self.running:
+            delivered = False
+            try:
+                self.cvp.connect()
+                for update in self.cvp.updates():
+                    delivered = True
+                    yield update
+                logging.warning("-- Connection lost --")
+            except (OSError, HandshakeError, ProtocolError) as ex:
+                if not self.running:
+                    break
+                logging.warning("-- Connection failed: %s --", ex)
+                if self._exhausted(attempt + 1):
+                    raise
+            finally:
+                self._close()
+            # only a connection that delivered something resets the backoff
+            attempt = 0 if delivered else attempt + 1
+            if self._exhausted(attempt):
+                break
+            if self.running:
+                self.reconnects += 1
+                time.sleep(self.delay(attempt))
+
+    def listen(self, report_fn=None, sinks=()) -> None:
+        """
+        Coinvwap.listen across reconnects, the sinks stay open meanwhile.
+        """
+        self.cvp.consume(self.updates(), report_fn, sinks)
+
+    def _exhausted(self, attempt: int) -> bool:
+        return self.max_retries is not None and attempt > self.max_retries
+
+    def _close(self) -> None:
+        if self.cvp.sock:
+            try:
+                self.cvp.sock.close()
+            except OSError:
+                pass
+
+    def stop(self) -> None:
+        """
+        Stop reconnecting, the blocked read of the current connection is
+        woken up by shutting the socket down.
+        """
+        self.running = False
+        self.cvp.disconnect()
+        if self.cvp.sock:
+            try:
+                self.cvp.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
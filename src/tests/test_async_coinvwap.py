@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from async_coinvwap import AsyncCoinvwap
+from handshake import HandshakeError, websocket_accept
+
+
+async def _serve_sample(reader, writer):
+    request = (await reader.readuntil(b"\r\n\r\n")).decode()
+    key = request.split("Sec-WebSocket-Key: ")[1].split("\r\n")[0]
+    writer.write(
+        b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+        b"Sec-WebSocket-Accept: " + websocket_accept(key).encode() + b"\r\n\r\n"
+    )
+    await reader.read(1024)  # subscription
+    with open("src/tests/data/recv.stream_sample", "rb") as sample:
+        writer.write(sample.read())
+    await writer.drain()
+    writer.close()
+
+
+async def _refuse(reader, writer):
+    await reader.readuntil(b"\r\n\r\n")
+    writer.write(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+    writer.close()
+
+
+async def _collect(handler):
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    cvp = AsyncCoinvwap(url=f"ws://127.0.0.1:{port}/")
+    updates = [update async for update in cvp]
+    await cvp.disconnect()
+    server.close()
+    await server.wait_closed()
+    return updates
+
+
+def test_async_coinvwap_updates():
+    updates = asyncio.run(_collect(_serve_sample))
+
+    assert len(updates) == 120  # ticker frames only
+    assert updates[0].product_id == "ETH-USD"
+    assert updates[0].vwap == 3149.35
+    assert updates[-1].product_id == "BTC-USD"
+    assert updates[-1].points == 61
+
+
+def test_async_coinvwap_refused():
+    with pytest.raises(HandshakeError):
+        asyncio.run(_collect(_refuse))
@@ -0,0 +1,142 @@
+import gzip
+import io
+import json
+
+from batch import batch_vwap, read_series, write_series, write_vwap
+from vwap import VWAPStore
+
+PRODUCTS = ["BTC-USD", "ETH-USD", "ETH-BTC", "LTC-USD"]
+
+
+def _trades(count=400):
+    for idx in range(count):
+        yield {
+            "type": "match" if idx % 7 else "received",
+            "product_id": PRODUCTS[idx * 5 % 7 % len(PRODUCTS)],
+            "price": f"{100 + idx % 13 * 0.37:.2f}",
+            "size": f"{0.001 + idx % 5 * 0.1:.8f}",
+            "time": f"2022-02-17T01:29:{idx % 60:02d}.{idx:06d}Z",
+        }
+
+
+def _expected(trades, window):
+    store = VWAPStore(PRODUCTS, "price", "size", type_field="match", window=window)
+    expected = {product_id: [] for product_id in PRODUCTS}
+    for trade in trades:
+        product_id = store.store(trade)
+        if product_id:
+            update = store.update(product_id)
+            expected[product_id].append(
+                (update.time, update.vwaps or (update.vwap,), update.points)
+            )
+    return {product_id: rows for product_id, rows in expected.items() if rows}
+
+
+def _rows(series):
+    return {
+        product_id: [
+            (stamp, tuple(vwaps[row] for vwaps in product.vwaps), product.points[row])
+            for row, stamp in enumerate(product.times)
+        ]
+        for product_id, product in series.items()
+    }
+
+
+def _write_ndjson(path, trades):
+    with open(path, "w", encoding="utf-8") as dump:
+        for trade in trades:
+            dump.write(json.dumps(trade) + "\n")
+
+
+def test_ndjson_matches_live_store(tmp_path):
+    trades = list(_trades())
+    path = str(tmp_path / "trades.ndjson")
+    _write_ndjson(path, trades)
+
+    expected = _expected(trades, [5, 20])
+    for processes in (1, 3):
+        series = batch_vwap(
+            path, window=[5, 20], processes=processes, type_field="match"
+        )
+        assert _rows(series) == expected
+
+
+def test_csv_matches_live_store(tmp_path):
+    trades = [trade for trade in _trades() if trade["type"] == "match"]
+    path = str(tmp_path / "trades.csv")
+    with open(path, "w", encoding="utf-8") as dump:
+        dump.write("time,product_id,size,price\n")
+        for trade in trades:
+            dump.write(
+                f"{trade['time']},{trade['product_id']},{trade['size']},"
+                f"{trade['price']}\n"
+            )
+
+    expected = _expected(trades, 10)
+    assert _rows(batch_vwap(path, window=10, processes=1)) == expected
+    assert _rows(batch_vwap(path, window=10, processes=2)) == expected
+
+
+def test_gzip_and_output(tmp_path):
+    trades = list(_trades(50))
+    path = str(tmp_path / "trades.ndjson.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as dump:
+        for trade in trades:
+            dump.write(json.dumps(trade) + "\n")
+
+    series = batch_vwap(path, window=3, processes=1, type_field="match")
+    assert _rows(series) == _expected(trades, 3)
+
+    output = tmp_path / "vwap.csv"
+    with open(output, "w", encoding="utf-8") as out:
+        write_series(series, out)
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == sum(len(product.times) for product in series.values())
+    product_id, stamp, vwap, points = lines[0].split(",")
+    first = series[product_id]
+    assert (stamp, float(vwap), int(points)) == (first.times[0], first.vwaps[0][0], 1)
+
+
+def test_quoted_csv_and_tricky_ndjson(tmp_path):
+    trades = [trade for trade in _trades(120) if trade["type"] == "match"]
+    path = str(tmp_path / "trades.csv")
+    with open(path, "w", encoding="utf-8") as dump:
+        dump.write('"note","product_id","size","price","time"\n')
+        for trade in trades:
+            dump.write(
+                f'"a, b",{trade["product_id"]},"{trade["size"]}",{trade["price"]},'
+                f'{trade["time"]}\n'
+            )
+    expected = _expected(trades, 5)
+    assert _rows(batch_vwap(path, window=5, processes=3)) == expected
+
+    # the key text inside another value, escaped quotes and spacing
+    path = str(tmp_path / "trades.ndjson")
+    with open(path, "w", encoding="utf-8") as dump:
+        for trade in trades:
+            note = {"note": '"product_id": "BTC-USD" \\"'}
+            dump.write(json.dumps({**note, **trade}, indent=1).replace("\n", "") + "\n")
+    assert _rows(batch_vwap(path, window=5, processes=3)) == expected
+
+
+def test_write_vwap_streams_workers(tmp_path):
+    trades = list(_trades())
+    path = str(tmp_path / "trades.ndjson")
+    _write_ndjson(path, trades)
+
+    outputs = []
+    for processes in (1, 4):
+        output = io.StringIO()
+        write_vwap(
+            path,
+            output,
+            window=[5, 20],
+            processes=processes,
+            type_field="match",
+            work_dir=str(tmp_path),
+        )
+        outputs.append(output.getvalue())
+    assert sorted(outputs[0].splitlines()) == sorted(outputs[1].splitlines())
+    output.seek(0)
+    assert _rows(read_series(output)) == _expected(trades, [5, 20])
+    assert [entry.name for entry in tmp_path.iterdir()] == ["trades.ndjson"]
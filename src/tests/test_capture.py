@@ -0,0 +1,55 @@
+import socket
+
+import pytest
+
+from capture import CaptureReader, CaptureWriter, replay
+from coinvwap import Coinvwap
+from payload import FrameDecoder
+from vwap import VWAPStore
+
+
+def _store():
+    return VWAPStore(["BTC-USD", "ETH-USD", "ETH-BTC"], "price", "last_size")
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / "feed.cap")
+    cvp = Coinvwap()
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+    cvp.record(path)
+    with open("src/tests/data/recv.stream_sample", "rb") as sample:
+        server.sendall(sample.read())
+    server.shutdown(socket.SHUT_WR)
+    live = list(cvp.updates())
+    cvp.stop_recording()
+    cvp.sock.close()
+    server.close()
+
+    with CaptureReader(path) as reader:
+        records = [(timestamp, bytes(payload)) for timestamp, payload in reader]
+    assert len(records) == 166
+    assert records[0][1].startswith(b'{"type":"ticker"')
+    assert list(replay(path, _store())) == live
+
+
+def test_replay_paced_and_truncated(tmp_path):
+    path = str(tmp_path / "paced.cap")
+    payload = b'{"type":"ticker","product_id":"BTC-USD","price":"10","last_size":"1"}'
+    with CaptureWriter(path) as writer:
+        writer.write(payload, timestamp=0)
+        writer.write(payload, timestamp=20_000_000)
+    with open(path, "ab") as capture:
+        capture.write(b"\x00\x01")  # interrupted record
+
+    updates = list(replay(path, _store(), paced=True, speed=2.0))
+
+    assert [update.points for update in updates] == [1, 2]
+
+
+def test_capture_reader_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a capture")
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
@@ -1,4 +1,13 @@
-from coinvwap import Coinvwap
+import io
+import json
+import socket
+
+import pytest
+
+from coinvwap import Coinvwap, CoinvwapBase
+from payload import FrameDecoder
+from report import Reporter
+from subscribe import ABNF
 
 
 def test_coinvwap_init():
@@ -8,3 +17,146 @@ def test_coinvwap_init():
         init_report
         == """BTC-USD\t000.000000\nETH-USD\t000.000000\nETH-BTC\t000.000000\n"""
     )
+
+
+def test_coinvwap_base_needs_a_transport():
+    class NoTransport(CoinvwapBase):
+        pass
+
+    with pytest.raises(TypeError):
+        NoTransport()  # pylint: disable=abstract-class-instantiated
+
+
+def test_coinvwap_listen():
+    cvp = Coinvwap()
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+
+    with open("src/tests/data/recv.stream_sample", "rb") as sample:
+        server.sendall(sample.read())
+    server.shutdown(socket.SHUT_WR)
+
+    reports = []
+    cvp.listen(report_fn=lambda report, end: reports.append(report))
+    cvp.sock.close()
+    server.close()
+
+    assert len(reports) == 120  # ticker frames only
+    assert not cvp.connected
+    assert reports[-1].startswith("BTC-USD\t44124.453102\tpoints:\t61\n")
+
+
+def test_coinvwap_listen_control_frames():
+    cvp = Coinvwap()
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+
+    ticker = b'{"type":"ticker","product_id":"ETH-BTC","price":"0.05","last_size":"2"}'
+    for opcode, data in [
+        (ABNF.OPCODE_PING, b""),
+        (ABNF.OPCODE_PING, b"beat"),
+        (ABNF.OPCODE_TEXT, ticker),
+        (ABNF.OPCODE_CLOSE, b"\x03\xe8bye"),
+        (ABNF.OPCODE_TEXT, ticker),
+    ]:
+        server.sendall(ABNF(1, 0, 0, 0, opcode, mask=0, data=data).format())
+
+    cvp.listen()
+    cvp.sock.close()
+
+    server_decoder = FrameDecoder()
+    while server_decoder.recv_into(server):
+        pass
+    server.close()
+    answers = [(opcode, bytes(data)) for opcode, data in server_decoder.frames()]
+
+    assert not cvp.connected
+    assert cvp.vwap.points("ETH-BTC") == 1
+    assert answers[1:] == [
+        (ABNF.OPCODE_PONG, b""),
+        (ABNF.OPCODE_PONG, b"beat"),
+        (ABNF.OPCODE_CLOSE, b"\x03\xe8"),
+    ]
+    assert answers[0][0] == ABNF.OPCODE_TEXT
+
+
+def test_coinvwap_listen_sinks():
+    cvp = Coinvwap()
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+    with open("src/tests/data/recv.stream_sample", "rb") as sample:
+        server.sendall(sample.read())
+    server.shutdown(socket.SHUT_WR)
+
+    output = io.BytesIO()
+    cvp.listen(sinks=[Reporter(cvp.vwap, output, every_messages=1000)])
+    cvp.sock.close()
+    server.close()
+
+    lines = output.getvalue().decode().splitlines()
+    assert sorted(lines) == sorted(cvp.vwap.report(point_counts=True).splitlines())
+
+
+def test_coinvwap_add_remove_products_live():
+    cvp = Coinvwap(product_ids=["BTC-USD"])
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+
+    assert cvp.add_products(["ETH-USD", "BTC-USD"]) == ["ETH-USD"]
+    assert cvp.remove_products(["BTC-USD", "XRP-USD"]) == ["BTC-USD"]
+    # freed by the reading thread, not the caller's
+    assert list(cvp.vwap.prices_n_vols) == ["BTC-USD", "ETH-USD"]
+
+    ticker = '{"type":"ticker","product_id":"%s","price":"2","last_size":"1"}'
+    for product_id in ("BTC-USD", "ETH-USD"):
+        frame = (ticker % product_id).encode()
+        server.sendall(ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=frame).format())
+    server.shutdown(socket.SHUT_WR)
+    updates = list(cvp.updates())
+    cvp.sock.close()
+    assert cvp.handler.product_ids == ["ETH-USD"]
+    assert list(cvp.vwap.prices_n_vols) == ["ETH-USD"]
+
+    server_decoder = FrameDecoder()
+    while server_decoder.recv_into(server):
+        pass
+    server.close()
+    sent = [json.loads(bytes(data)) for _, data in server_decoder.frames()]
+
+    assert [(msg["type"], msg["product_ids"]) for msg in sent] == [
+        ("subscribe", ["ETH-USD"]),
+        ("unsubscribe", ["BTC-USD"]),
+        ("subscribe", ["ETH-USD"]),  # the full subscription of updates()
+    ]
+    # the removed product is dropped, the added one is stored
+    assert [update.product_id for update in updates] == ["ETH-USD"]
+
+
+def test_coinvwap_remove_then_add_while_connected():
+    cvp = Coinvwap(product_ids=["BTC-USD", "ETH-USD"])
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+
+    assert cvp.remove_products(["ETH-USD"]) == ["ETH-USD"]
+    assert cvp.remove_products(["ETH-USD"]) == []
+    # cancels the pending removal, subscribed again
+    assert cvp.add_products(["ETH-USD"]) == ["ETH-USD"]
+    cvp.apply_removals()
+    cvp.sock.close()
+
+    assert cvp.vwap.follows("ETH-USD")
+    assert cvp.handler.product_ids == ["BTC-USD", "ETH-USD"]
+    server_decoder = FrameDecoder()
+    while server_decoder.recv_into(server):
+        pass
+    server.close()
+    sent = [json.loads(bytes(data)) for _, data in server_decoder.frames()]
+    assert [(msg["type"], msg["product_ids"]) for msg in sent] == [
+        ("unsubscribe", ["ETH-USD"]),
+        ("subscribe", ["ETH-USD"]),
+    ]
@@ -0,0 +1,126 @@
+import shutil
+import socket
+import ssl
+import subprocess
+import time
+from threading import Thread
+
+import pytest
+
+from connection import ConnectionFactory
+from handshake import HandshakeError, ProtocolHandler, accept_upgrade
+from payload import FrameDecoder
+from subscribe import ABNF
+
+
+def _serve(server, connections, wrap=None, accept=True):
+    for _ in range(connections):
+        conn, _ = server.accept()
+        if wrap:
+            conn = wrap(conn)
+        if accept:
+            accept_upgrade(conn)
+            conn.sendall(ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, 0, b"hello").format())
+        else:
+            conn.recv(4096)
+            conn.sendall(
+                b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n\r\n"
+            )
+        conn.recv(4096)
+        conn.close()
+
+
+def test_factory_failover_and_leftover():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    dead = socket.create_server(("127.0.0.1", 0))
+    dead_port = dead.getsockname()[1]
+    dead.close()
+    Thread(target=_serve, args=(server, 1), daemon=True).start()
+
+    factory = ConnectionFactory(
+        ProtocolHandler(f"ws://127.0.0.1:{port}/", ["BTC-USD"], "ticker")
+    )
+    live = (socket.AF_INET, ("127.0.0.1", port))
+    factory.addresses = [(socket.AF_INET, ("127.0.0.1", dead_port)), live]
+    factory.resolved = time.monotonic()
+    decoder = FrameDecoder()
+    sock, response = factory.connect(decoder)
+
+    assert factory.addresses[0] == live
+    assert factory.handler.check_switch_response(response)["upgrade"] == "websocket"
+    # the frame sent along with the 101 response was not lost
+    assert [bytes(data) for _, data in decoder.frames()] == [b"hello"]
+    sock.close()
+    server.close()
+
+
+def test_reconnect_after_refresh():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    Thread(target=_serve, args=(server, 2), daemon=True).start()
+
+    factory = ConnectionFactory(
+        ProtocolHandler(f"ws://127.0.0.1:{port}/", ["BTC-USD"], "ticker")
+    )
+    for _ in range(2):
+        sock, response = factory.connect(FrameDecoder())
+        # accepts the key sent on this very connection
+        factory.handler.check_switch_response(response)
+        sock.close()
+        # e.g. after add_products
+        factory.handler.product_ids.append("ETH-USD")
+        factory.refresh()
+        assert len(factory.upgrade) == 2
+    server.close()
+
+
+def test_switch_response_wrong_accept():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    Thread(target=_serve, args=(server, 1, None, False), daemon=True).start()
+
+    factory = ConnectionFactory(
+        ProtocolHandler(f"ws://127.0.0.1:{port}/", ["BTC-USD"], "ticker")
+    )
+    sock, response = factory.connect(FrameDecoder())
+    with pytest.raises(HandshakeError):
+        factory.handler.check_switch_response(response)
+    sock.close()
+    server.close()
+
+
+@pytest.mark.skipif(not shutil.which("openssl"), reason="openssl is not installed")
+def test_factory_resumes_tls_session(tmp_path):
+    cert, key = str(tmp_path / "cert.pem"), str(tmp_path / "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+        + ["-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost"]
+        + ["-keyout", key, "-out", cert],
+        check=True,
+        capture_output=True,
+    )
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    Thread(
+        target=_serve,
+        args=(server, 2, lambda conn: context.wrap_socket(conn, server_side=True)),
+        daemon=True,
+    ).start()
+
+    factory = ConnectionFactory(
+        ProtocolHandler(f"wss://localhost:{port}/", ["BTC-USD"], "ticker")
+    )
+    factory.ssl_context.load_verify_locations(cert)
+    factory.addresses = [(socket.AF_INET, ("127.0.0.1", port))]
+    factory.resolved = time.monotonic()
+
+    first, _ = factory.connect(FrameDecoder())
+    assert not first.session_reused
+    first.close()
+    second, _ = factory.connect(FrameDecoder())
+    assert second.session_reused
+    second.close()
+    server.close()
@@ -0,0 +1,81 @@
+import pytest
+
+from decoders import FieldExtractor, JsonDecoder, get_decoder
+from payload import FrameDecoder, parse_payload
+from vwap import VWAPStore
+
+
+def _sample_payloads():
+    decoder = FrameDecoder()
+    with open("src/tests/data/recv.stream_sample", "rb") as sample:
+        decoder.feed(sample.read())
+    return [bytes(data) for _, data in decoder.frames()]
+
+
+def _store():
+    return VWAPStore(["BTC-USD", "ETH-USD", "ETH-BTC"], "price", "last_size")
+
+
+def test_field_extractor_matches_full_decoding():
+    payloads = _sample_payloads()
+    full, fast = _store(), _store()
+    extract = get_decoder("fields", fast)
+
+    for payload in payloads:
+        assert full.store(parse_payload(payload)) == fast.store(extract(payload))
+
+    assert fast.report(point_counts=True) == full.report(point_counts=True)
+    assert extract(payloads[0]) == {
+        "type": "ticker",
+        "product_id": "ETH-USD",
+        "price": "3149.35",
+        "last_size": "0.00275791",
+        "time": "2022-02-17T01:29:30.220661Z",
+        "sequence": 25817411093,
+        "trade_id": 224332747,
+    }
+    # numbers come back like a full decoder returns them
+    full_payload = parse_payload(payloads[0])
+    assert extract(payloads[0])["sequence"] == full_payload["sequence"]
+
+
+def test_field_extractor_non_compact_json():
+    store = _store()
+    extract = get_decoder("fields", store)
+    payload = (
+        b'{"type": "ticker", "sequence": 12, "product_id": "BTC-USD",'
+        b' "price": "44121.17", "last_size": "0.5", "best_bid": 1.5}'
+    )
+    assert extract(payload) == {
+        "type": "ticker",
+        "product_id": "BTC-USD",
+        "price": "44121.17",
+        "last_size": "0.5",
+        "sequence": 12,
+    }
+    assert store.store(extract(payload)) == "BTC-USD"
+    assert extract(b'{"type": "heartbeat", "sequence": 1}') == {"type": "heartbeat"}
+    # compact type, spaced values
+    assert FieldExtractor(("price", "size"))(
+        b'{"type":"ticker","price": "1.5","size": 2.5}'
+    ) == {"type": "ticker", "price": "1.5", "size": 2.5}
+
+
+def test_field_extractor_skips_other_types():
+    extract = FieldExtractor(("price",))
+
+    assert extract(memoryview(b'{"type":"heartbeat","price":"1"}')) == {
+        "type": "heartbeat"
+    }
+    assert extract(b'{"price":"1"}') == {"type": None}
+
+
+def test_json_decoder_backends():
+    payload = memoryview(_sample_payloads()[0])
+    expected = parse_payload(payload)
+
+    assert get_decoder("stdlib", None)(payload) == expected
+    assert JsonDecoder()(payload) == expected
+    with pytest.raises(ImportError):
+        JsonDecoder("no-such-backend")
+    assert get_decoder(len, None) is len
@@ -0,0 +1,121 @@
+import json
+import socket
+import time
+
+from fanout import FanoutClient, FanoutServer
+from handshake import ProtocolHandler
+from payload import FrameDecoder
+from subscribe import ABNF
+from vwap import VWAPUpdate
+
+
+def _wait_clients(server: FanoutServer, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while len(server.clients) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(server.clients) == count
+
+
+def test_fanout_tcp_lines():
+    server = FanoutServer().start()
+    try:
+        sock = socket.create_connection(server.address, timeout=5)
+        _wait_clients(server, 1)
+        server.publish(VWAPUpdate("BTC-USD", 10.5, 3, "2022-01-01T00:00:00Z"))
+        server.publish(VWAPUpdate("ETH-USD", 2.0, 1))
+
+        received = b""
+        while received.count(b"\n") < 2:
+            received += sock.recv(4096)
+        lines = [json.loads(line) for line in received.splitlines()]
+        assert lines[0]["product_id"] == "BTC-USD"
+        assert lines[0]["vwap"] == 10.5
+        assert lines[0]["time"] == "2022-01-01T00:00:00Z"
+        assert lines[1]["product_id"] == "ETH-USD"
+        sock.close()
+    finally:
+        server.close()
+
+
+def _subscribe(server: FanoutServer) -> socket.socket:
+    sock = socket.create_connection(server.address, timeout=5)
+    host, port = server.address
+    handler = ProtocolHandler(f"ws://{host}:{port}/", ["BTC-USD"], "ticker")
+    sock.sendall(handler.get_init_request())
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += sock.recv(1024)
+    handler.check_switch_response(response)
+    return sock
+
+
+def _next_frames(sock: socket.socket, decoder: FrameDecoder):
+    frames = []
+    while not frames:
+        assert decoder.recv_into(sock)
+        frames = [(op, bytes(data)) for op, data in decoder.frames()]
+    return frames
+
+
+def test_fanout_websocket_frames():
+    server = FanoutServer(protocol="websocket").start()
+    try:
+        # a subscriber stalled in its handshake delays nobody
+        stalled = socket.create_connection(server.address, timeout=5)
+        sock = _subscribe(server)
+        _wait_clients(server, 1)
+
+        server.publish(VWAPUpdate("BTC-USD", 10.5, 3))
+        frames = _next_frames(sock, FrameDecoder())
+        assert frames[0][0] == ABNF.OPCODE_TEXT
+        assert json.loads(frames[0][1])["product_id"] == "BTC-USD"
+        sock.close()
+        stalled.close()
+    finally:
+        server.close()
+
+
+def test_fanout_websocket_ping_and_close():
+    server = FanoutServer(protocol="websocket", handshake_timeout=0.2).start()
+    try:
+        sock = _subscribe(server)
+        _wait_clients(server, 1)
+        decoder = FrameDecoder()
+
+        sock.sendall(ABNF.create_frame(b"hi", ABNF.OPCODE_PING).format())
+        assert _next_frames(sock, decoder) == [(ABNF.OPCODE_PONG, b"hi")]
+
+        sock.sendall(ABNF.create_frame(b"\x03\xe8", ABNF.OPCODE_CLOSE).format())
+        assert _next_frames(sock, decoder) == [(ABNF.OPCODE_CLOSE, b"\x03\xe8")]
+        assert not sock.recv(16)
+        sock.close()
+        server.publish(VWAPUpdate("BTC-USD", 10.5, 3))
+        assert server.stats()["clients"] == 0
+    finally:
+        server.close()
+
+
+def test_fanout_client_drop_oldest():
+    left, right = socket.socketpair()
+    client = FanoutClient(left, "drop_oldest", queue_size=2)
+    with client.ready:  # the sender thread can not drain meanwhile
+        for idx in range(4):
+            client.offer("BTC-USD", b"%d" % idx)
+        assert list(client.queue) == [b"2", b"3"]
+        assert client.dropped == 2
+    assert right.recv(16) == b"23"
+    client.close()
+    right.close()
+
+
+def test_fanout_client_conflate():
+    left, right = socket.socketpair()
+    client = FanoutClient(left, "conflate", queue_size=2)
+    with client.ready:
+        client.offer("BTC-USD", b"a")
+        client.offer("ETH-USD", b"b")
+        client.offer("BTC-USD", b"c")
+        assert client.dropped == 1
+    assert right.recv(16) == b"bc"
+    client.close()
+    right.close()
@@ -0,0 +1,185 @@
+import json
+from fractions import Fraction
+
+import pytest
+
+from batch import batch_vwap
+from fixedpoint import FixedPointRingBuffer, decimals, to_scaled
+from registry import LazyVWAPStore
+from vwap import VWAPStore
+
+INCREMENTS = {"ETH-BTC": ("0.00001", "0.00000001"), "BTC-USD": ("0.01", "0.00000001")}
+
+
+def _match(product_id, price, size, stamp="2022-02-17T01:29:30.220661Z"):
+    return {
+        "type": "match",
+        "product_id": product_id,
+        "price": price,
+        "size": size,
+        "time": stamp,
+    }
+
+
+def _trades(count=700):
+    for idx in range(count):
+        yield _match(
+            "ETH-BTC",
+            f"0.0{5000 + idx * 37 % 991:04d}",
+            f"{idx % 9}.{idx * 7919 % 10 ** 8:08d}",
+        )
+
+
+def _exact(trades, window):
+    points = [(Fraction(t["price"]), Fraction(t["size"])) for t in trades][-window:]
+    volume = sum(q for _, q in points)
+    return float(sum(p * q for p, q in points) / volume) if volume else 0.0
+
+
+def test_to_scaled():
+    assert decimals("0.01000000") == 2
+    assert decimals("1") == 0
+    assert to_scaled("0.05123", 8) == 5123000
+    assert to_scaled("43712.5", 2) == 4371250
+    assert to_scaled("0.10000000", 2) == 10
+    assert to_scaled("7", 3) == 7000
+    assert decimals("1e-05") == 5
+    # finer than the increment: rounded, half to even
+    assert to_scaled("43712.015", 2) == 4371202
+    assert to_scaled("43712.025", 2) == 4371202
+    assert to_scaled("0.1239", 3) == 124
+    # numbers and scientific notation
+    assert to_scaled(0.05, 8) == 5000000
+    assert to_scaled(12, 2) == 1200
+    assert to_scaled("1.5e-05", 8) == 1500
+    assert to_scaled(1e-05, 8) == 1000
+    with pytest.raises(ValueError):
+        to_scaled("abc", 2)
+
+
+def test_finer_prices_and_huge_sizes():
+    store = VWAPStore(
+        ["BTC-USD", "SHIB-USD"],
+        "price",
+        "size",
+        type_field="match",
+        increments=INCREMENTS,
+    )
+    assert store.store(_match("BTC-USD", "43712.015", "1")) == "BTC-USD"
+    assert store.vwap("BTC-USD") == 43712.02
+
+    # 2e11 SHIB is 2e19 units at 8 decimals, beyond int64
+    store.store(_match("SHIB-USD", "0.00001", "1000"))
+    store.store(_match("SHIB-USD", "0.00002", "200000000000"))
+    window = store.prices_n_vols["SHIB-USD"]
+    assert isinstance(window.vols, list)
+    assert store.vwap("SHIB-USD") == float(
+        Fraction(1000 * 1 + 200000000000 * 2, 200000001000 * 10**5)
+    )
+
+
+def test_store_is_exact():
+    trades = list(_trades())
+    store = VWAPStore(
+        ["ETH-BTC"],
+        "price",
+        "size",
+        type_field="match",
+        window=[5, 50],
+        increments=INCREMENTS,
+    )
+    for count, trade in enumerate(trades, 1):
+        assert store.store(trade) == "ETH-BTC"
+        assert store.vwap("ETH-BTC") == _exact(trades[:count], 5)
+    assert store.vwap("ETH-BTC", 50) == _exact(trades, 50)
+    window = store.prices_n_vols["ETH-BTC"]
+    assert isinstance(window, FixedPointRingBuffer)
+    assert window.prices.typecode == "q"
+    assert isinstance(window.sums_pq[0], int)
+
+
+def test_default_increments_and_float_mode():
+    store = VWAPStore(["LTC-USD"], "price", "size", type_field="match", increments={})
+    store.store(_match("LTC-USD", "0.1", "0.2"))
+    store.store(_match("LTC-USD", "0.2", "0.1"))
+    assert store.vwap("LTC-USD") == float(Fraction(4, 30))
+    assert store.add_products(["SOL-USD"]) == ["SOL-USD"]
+    assert isinstance(store.prices_n_vols["SOL-USD"], FixedPointRingBuffer)
+    assert not isinstance(
+        VWAPStore(["LTC-USD"], "price", "size").prices_n_vols["LTC-USD"],
+        FixedPointRingBuffer,
+    )
+
+
+def test_lazy_store_and_snapshot(tmp_path):
+    store = LazyVWAPStore(
+        ["ETH-BTC", "BTC-USD"],
+        "price",
+        "size",
+        type_field="match",
+        window=5,
+        max_windows=1,
+        increments=INCREMENTS,
+    )
+    trades = list(_trades(20))
+    for trade in trades:
+        store.store(trade)
+    vwap = store.vwap("ETH-BTC")
+    assert vwap == _exact(trades, 5)
+
+    path = str(tmp_path / "vwap.snapshot")
+    assert store.snapshot(path) == 1
+    restored = VWAPStore(
+        ["ETH-BTC"],
+        "price",
+        "size",
+        type_field="match",
+        window=5,
+        increments=INCREMENTS,
+    )
+    assert restored.restore(path) == 1
+    window = restored.prices_n_vols["ETH-BTC"]
+    assert isinstance(window, FixedPointRingBuffer)
+    assert restored.vwap("ETH-BTC") == vwap
+
+    # evicting leaves a float summary of the same VWAP
+    store.store(_match("BTC-USD", "43712.01", "0.5"))
+    assert store.counters()["evicted"] == 1
+    assert store.vwap("ETH-BTC") == pytest.approx(vwap, rel=1e-12)
+    assert store.vwap("BTC-USD") == 43712.01
+
+
+def test_batch_numeric_values(tmp_path):
+    path = tmp_path / "trades.ndjson"
+    trades = [_match("BTC-USD", 43712.01, 0.5), _match("BTC-USD", 43713, 1e-05)]
+    path.write_text("".join(json.dumps(t) + "\n" for t in trades), encoding="utf-8")
+
+    series = batch_vwap(str(path), window=5, processes=1, increments={})
+    assert list(series["BTC-USD"].vwaps[0]) == [
+        43712.01,
+        float(
+            (Fraction("43712.01") * Fraction("0.5") + 43713 * Fraction("0.00001"))
+            / Fraction("0.50001")
+        ),
+    ]
+
+
+def test_batch_matches_store(tmp_path):
+    trades = list(_trades(300))
+    path = tmp_path / "trades.ndjson"
+    path.write_text("".join(json.dumps(t) + "\n" for t in trades), encoding="utf-8")
+
+    series = batch_vwap(str(path), window=20, processes=1, increments=INCREMENTS)
+    store = VWAPStore(
+        ["ETH-BTC"],
+        "price",
+        "size",
+        type_field="match",
+        window=20,
+        increments=INCREMENTS,
+    )
+    expected = []
+    for trade in trades:
+        store.store(trade)
+        expected.append(store.vwap("ETH-BTC"))
+    assert list(series["ETH-BTC"].vwaps[0]) == expected
@@ -0,0 +1,25 @@
+from handshake import ProtocolHandler
+
+
+def test_compression_offered():
+    handler = ProtocolHandler("wss://example.com/", ["BTC-USD"], "ticker", True)
+    assert (
+        b"Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n"
+        in handler.get_init_request()
+    )
+    plain = ProtocolHandler("wss://example.com/", ["BTC-USD"], "ticker")
+    assert b"Sec-WebSocket-Extensions" not in plain.get_init_request()
+
+
+def test_get_deflate_params():
+    response = (
+        b"HTTP/1.1 101 Switching Protocols\r\n"
+        b"Upgrade: websocket\r\n"
+        b"sec-websocket-extensions: permessage-deflate; "
+        b"server_no_context_takeover; client_max_window_bits=15\r\n\r\n"
+    )
+    assert ProtocolHandler.get_deflate_params(response) == {
+        "server_no_context_takeover": "",
+        "client_max_window_bits": "15",
+    }
+    assert ProtocolHandler.get_deflate_params(b"HTTP/1.1 101 OK\r\n\r\n") is None
@@ -2,6 +2,7 @@ import time
 from threading import Thread
 
 from coinvwap import Coinvwap
+from mockserver import MockCoinbaseServer
 
 
 class SimpleTextBuffer:
@@ -39,3 +40,26 @@ def test_integration():
     assert float(data[-2][1]) > 0.0
     assert data[-2][2] == "points:"
     assert int(data[-2][3]) > 0
+
+
+def test_integration_mock_server():
+    """
+    The same flow against a local MockCoinbaseServer, runs offline.
+    """
+    server = MockCoinbaseServer(messages=300, rate=5000).start()
+    buf = SimpleTextBuffer()
+    cvp = Coinvwap(product_ids=["BTC-USD", "ETH-USD", "ETH-BTC"], url=server.url)
+    cvp.connect()
+    listen_thread = Thread(target=cvp.listen, kwargs={"report_fn": buf.write})
+    listen_thread.start()
+    listen_thread.join(timeout=10)
+    cvp.disconnect()
+    server.stop()
+
+    rows = buf.readall().split("\n")
+    data = [row.split("\t") for row in rows]
+
+    assert len(data) == 300 * 3 + 1
+    assert data[-2][0] == "ETH-BTC"
+    assert float(data[-2][1]) > 0.0
+    assert data[-2][3] == "100"
@@ -0,0 +1,62 @@
+from benchmark import percentile, run_benchmark
+from coinvwap import Coinvwap
+from mockserver import MockCoinbaseServer
+
+
+def test_mock_server_fragmented_and_coalesced():
+    server = MockCoinbaseServer(
+        messages=500, products=4, frame_size=600, coalesce=7, segment=333
+    ).start()
+    cvp = Coinvwap(product_ids=["A-USD", "B-USD"], url=server.url)
+    cvp.connect()
+    updates = list(cvp.updates())
+    cvp.sock.close()
+    server.stop()
+
+    assert len(updates) == 500
+    assert {update.product_id for update in updates} == {"A-USD", "B-USD"}
+    assert updates[-1].points == 200
+
+
+def test_run_benchmark():
+    results = run_benchmark(messages=300, rate=30000, products=5)
+
+    assert results["messages"] == 300
+    assert results["msgs_per_sec"] > 0
+    assert 0 <= results["p50_ms"] <= results["p99_ms"] <= results["p999_ms"]
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 3.0
+    assert percentile([1.0, 2.0], 0.999) == 2.0
+
+
+def test_mock_server_permessage_deflate():
+    server = MockCoinbaseServer(messages=300, products=2, compress=True).start()
+    cvp = Coinvwap(product_ids=server.product_ids, url=server.url, compression=True)
+    cvp.connect()
+    assert cvp.decoder.inflater is not None
+    updates = list(cvp.updates())
+    cvp.sock.close()
+    server.stop()
+
+    assert len(updates) == 300
+    assert updates[-1].points == 150
+
+
+def test_mock_server_reconnect_after_product_changes():
+    server = MockCoinbaseServer(messages=50).start()
+    cvp = Coinvwap(product_ids=["A-USD"], url=server.url)
+    products = []
+    for change in (None, ("add", ["B-USD"]), ("remove", ["A-USD"])):
+        if change:
+            kind, product_ids = change
+            getattr(cvp, f"{kind}_products")(product_ids)
+        # a fresh key per connection, the prebuilt request follows it
+        cvp.connect()
+        products.append({update.product_id for update in cvp.updates()})
+        cvp.sock.close()
+    server.stop()
+
+    assert products == [{"A-USD"}, {"A-USD", "B-USD"}, {"B-USD"}]
@@ -1,4 +1,9 @@
-from payload import split_frames
+import zlib
+
+import pytest
+
+from payload import FrameDecoder, parse_payload, parse_time, split_frames
+from subscribe import ABNF
 
 
 class FakeRecv:
@@ -64,3 +69,97 @@ def test_split_frames():
         "trade_id": 282258684,
         "last_size": "0.00108252",
     }
+
+
+def _frame(data, opcode=ABNF.OPCODE_TEXT, fin=1):
+    return ABNF(fin, 0, 0, 0, opcode, mask=0, data=data).format()
+
+
+def test_frame_decoder_lengths_and_partial_reads():
+    messages = [b"a" * 10, b"b" * 300, b"c" * 70000]
+    stream = b"".join(_frame(message) for message in messages)
+
+    decoder = FrameDecoder(buffer_size=64)
+    received = []
+    for carret in range(0, len(stream), 1000):
+        decoder.feed(stream[carret : carret + 1000])
+        received += [(opcode, bytes(data)) for opcode, data in decoder.frames()]
+
+    assert received == [(ABNF.OPCODE_TEXT, message) for message in messages]
+    assert decoder.start == decoder.end
+
+
+def test_frame_decoder_continuation_and_control():
+    decoder = FrameDecoder()
+    decoder.feed(_frame(b'{"type":', fin=0))
+    decoder.feed(_frame(b"hi", opcode=ABNF.OPCODE_PING))
+    decoder.feed(_frame(b'"ticker"}', opcode=ABNF.OPCODE_CONT))
+
+    received = [(opcode, bytes(data)) for opcode, data in decoder.frames()]
+
+    assert received == [
+        (ABNF.OPCODE_PING, b"hi"),
+        (ABNF.OPCODE_TEXT, b'{"type":"ticker"}'),
+    ]
+    assert parse_payload(memoryview(received[1][1])) == {"type": "ticker"}
+
+
+def test_frame_decoder_recv_into_keeps_leftover():
+    sample = open(  # pylint: disable=consider-using-with
+        "src/tests/data/recv.stream_sample", "rb"
+    )
+
+    class FakeSocket:
+        @staticmethod
+        def recv_into(view, nbytes=0):
+            data = sample.read(min(len(view), nbytes or len(view), 777))
+            view[: len(data)] = data
+            return len(data)
+
+    decoder = FrameDecoder(buffer_size=1024)
+    count = 0
+    while decoder.recv_into(FakeSocket):
+        count += sum(1 for _ in decoder.frames())
+    sample.close()
+
+    assert count == 166
+
+
+def test_parse_time():
+    assert parse_time("2022-02-17T01:29:30.220661Z") == 1645061370.220661
+    assert parse_time("2022-02-17T01:29:30.22Z") == 1645061370.22
+    assert parse_time("2022-02-17T01:29:30Z") == 1645061370.0
+
+
+def _deflated_frames(messages, fin=1):
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    for message in messages:
+        data = compressor.compress(message) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield ABNF(fin, 1, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=data[:-4]).format()
+
+
+def test_frame_decoder_permessage_deflate():
+    messages = [b'{"type":"ticker","price":"%d"}' % idx for idx in range(50)]
+    decoder = FrameDecoder()
+    decoder.enable_deflate()
+    received = []
+    # context takeover: every message refers to the previous ones
+    for frame in _deflated_frames(messages):
+        decoder.feed(frame)
+        received += [bytes(data) for _, data in decoder.frames()]
+    assert received == messages
+
+    # fragmented: RSV1 on the first frame only
+    compressed = next(_deflated_frames([b'{"type":"heartbeat"}']))[2:]
+    decoder = FrameDecoder()
+    decoder.enable_deflate()
+    decoder.feed(ABNF(0, 1, 0, 0, ABNF.OPCODE_TEXT, 0, compressed[:5]).format())
+    decoder.feed(_frame(compressed[5:], opcode=ABNF.OPCODE_CONT))
+    assert [bytes(data) for _, data in decoder.frames()] == [b'{"type":"heartbeat"}']
+
+
+def test_frame_decoder_deflate_without_negotiation():
+    decoder = FrameDecoder()
+    decoder.feed(next(_deflated_frames([b"{}"])))
+    with pytest.raises(ValueError):
+        list(decoder.frames())
@@ -0,0 +1,78 @@
+import socket
+import time
+
+import pytest
+
+from coinvwap import Coinvwap
+from mockserver import MockCoinbaseServer
+from payload import FrameDecoder, ProtocolError
+from pipeline import Pipeline
+from subscribe import ABNF
+
+
+def _pipeline(server, **options):
+    cvp = Coinvwap(product_ids=server.product_ids, url=server.url)
+    cvp.connect()
+    return Pipeline(cvp, **options)
+
+
+def test_pipeline_block_keeps_everything():
+    server = MockCoinbaseServer(messages=500, products=3, coalesce=9).start()
+    pipeline = _pipeline(server, queue_size=16)
+    reports = []
+    pipeline.listen(report_fn=lambda report, end: reports.append(report))
+    server.stop()
+
+    assert len(reports) == 500
+    metrics = pipeline.metrics()
+    assert metrics["received"] == 500
+    assert metrics["dropped"] == 0
+    assert 0 < metrics["max_depth"] <= 16
+    assert pipeline.cvp.vwap.points("P000-USD") == 167
+
+
+@pytest.mark.parametrize("overflow", ["drop_oldest", "drop_newest"])
+def test_pipeline_drops_under_slow_consumer(overflow):
+    server = MockCoinbaseServer(messages=400, products=1, coalesce=50).start()
+    pipeline = _pipeline(server, queue_size=10, overflow=overflow)
+    updates = []
+    for update in pipeline.updates():
+        updates.append(update)
+        time.sleep(0.002)
+    server.stop()
+
+    metrics = pipeline.metrics()
+    assert metrics["received"] == 400
+    assert metrics["dropped"] > 0
+    assert len(updates) + metrics["dropped"] == 400
+    assert metrics["max_depth"] <= 10
+
+
+def test_pipeline_stop_midway():
+    server = MockCoinbaseServer(messages=100000, rate=20000).start()
+    pipeline = _pipeline(server)
+    for count, _ in enumerate(pipeline.updates()):
+        if count == 50:
+            break
+    server.stop()
+    assert not pipeline.reader.is_alive()
+    assert not pipeline.cvp.connected
+
+
+def test_pipeline_raises_protocol_errors():
+    cvp = Coinvwap(product_ids=["BTC-USD"])
+    cvp.sock, server = socket.socketpair()
+    cvp.decoder = FrameDecoder()
+    cvp.connected = True
+    ticker = b'{"type":"ticker","product_id":"BTC-USD","price":"2","last_size":"1"}'
+    server.sendall(ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=ticker).format())
+    # compressed without permessage-deflate negotiated
+    server.sendall(ABNF(1, 1, 0, 0, ABNF.OPCODE_TEXT, mask=0, data=ticker).format())
+
+    updates = []
+    with pytest.raises(ProtocolError):
+        for update in Pipeline(cvp).updates():
+            updates.append(update)
+    server.close()
+    assert [update.product_id for update in updates] == ["BTC-USD"]
+    assert not cvp.connected
@@ -0,0 +1,93 @@
+import time
+
+from coinvwap import Coinvwap
+from registry import LazyVWAPStore, WindowSummary
+from vwap import VWAPStore
+
+
+def _tick(store, product_id, price, size=1):
+    return store.store(
+        {"type": "ticker", "product_id": product_id, "price": price, "last_size": size}
+    )
+
+
+def test_lazy_store_allocates_on_first_tick():
+    store = LazyVWAPStore(["A", "B", "C"], "price", "last_size", window=3)
+    assert not store.prices_n_vols
+    assert _tick(store, "B", 2) == "B"
+    assert _tick(store, "X", 2) is None
+
+    assert list(store.prices_n_vols) == ["B"]
+    assert store.counters() == {
+        "windows": 1,
+        "summaries": 0,
+        "allocated": 1,
+        "evicted": 0,
+        "dropped": 1,
+    }
+    # same report as the preallocated store
+    plain = VWAPStore(["A", "B", "C"], "price", "last_size", window=3)
+    _tick(plain, "B", 2)
+    assert store.report(point_counts=True) == plain.report(point_counts=True)
+
+
+def test_lazy_store_lru_eviction_to_summary():
+    store = LazyVWAPStore(
+        ["A", "B", "C"], "price", "last_size", window=[2, 4], max_windows=2
+    )
+    for price in (1, 2, 3):
+        _tick(store, "A", price)
+    _tick(store, "B", 10)
+    _tick(store, "A", 4)  # B is now the least recently updated
+    _tick(store, "C", 5)
+
+    assert list(store.prices_n_vols) == ["A", "C"]
+    assert store.summaries["B"] == WindowSummary((10.0, 10.0), (1.0, 1.0), (1, 1))
+    assert store.vwap("B") == 10.0
+    assert store.points("B", 4) == 1
+    assert store.update("A").vwaps == (3.5, 2.5)
+
+    # B ticks again: a fresh window, A goes to its summary
+    _tick(store, "B", 20)
+    assert list(store.prices_n_vols) == ["C", "B"]
+    assert store.vwap("B") == 20.0
+    assert "B" not in store.summaries and store.vwap("A") == 3.5
+    assert store.evicted == 2
+
+
+def test_lazy_store_idle_eviction():
+    store = LazyVWAPStore(["A", "B"], "price", "last_size", idle_seconds=0.01)
+    _tick(store, "A", 1)
+    time.sleep(0.02)
+    _tick(store, "B", 2)
+
+    assert list(store.prices_n_vols) == ["B"]
+    assert store.vwap("A") == 1.0
+
+
+def test_coinvwap_uses_lazy_store():
+    cvp = Coinvwap(product_ids=["A", "B"], max_windows=1)
+    assert isinstance(cvp.vwap, LazyVWAPStore)
+    assert cvp.vwap.max_windows == 1
+    assert cvp.add_products(["C"]) == ["C"]
+    assert cvp.handler.product_ids == ["A", "B", "C"]
+    assert cvp.remove_products(["A"]) == ["A"]
+    assert cvp.vwap.report() == "B\t000.000000\nC\t000.000000\n"
+
+
+def test_lazy_store_idle_eviction_after_restore(tmp_path):
+    path = str(tmp_path / "vwap.snapshot")
+    store = VWAPStore(["A"], "price", "last_size")
+    _tick(store, "A", 1)
+    store.snapshot(path)
+
+    lazy = LazyVWAPStore(["A", "B", "C"], "price", "last_size", idle_seconds=0.01)
+    assert lazy.restore(path) == 1
+    _tick(lazy, "B", 2)
+    time.sleep(0.02)
+    _tick(lazy, "C", 3)
+
+    # the restored window and B both went idle
+    assert list(lazy.prices_n_vols) == ["C"]
+    assert lazy.evicted == 2
+    assert (lazy.vwap("A"), lazy.vwap("B")) == (1.0, 2.0)
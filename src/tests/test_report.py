@@ -0,0 +1,62 @@
+import io
+import time
+
+from report import Reporter
+from vwap import VWAPStore, VWAPUpdate
+
+
+def _store():
+    store = VWAPStore(["BTC-USD", "ETH-USD"], "price", "last_size")
+    store.store(
+        {"type": "ticker", "product_id": "BTC-USD", "price": "10", "last_size": "1"}
+    )
+    return store
+
+
+def test_reporter_changed_only_coalesced():
+    output = io.BytesIO()
+    reporter = Reporter(_store(), output, every_messages=3)
+
+    reporter.publish(VWAPUpdate("BTC-USD", 10.0, 1))
+    reporter.publish(VWAPUpdate("BTC-USD", 11.0, 2))
+    assert output.getvalue() == b""
+    reporter.publish(VWAPUpdate("ETH-USD", 2.5, 1, vwaps=(2.5, 3.0), counts=(1, 1)))
+    reporter.publish(VWAPUpdate("ETH-USD", 2.0, 2))
+    reporter.close()
+
+    assert output.getvalue() == (
+        b"BTC-USD\t011.000000\tpoints:\t2\n"
+        b"ETH-USD\t002.500000\t003.000000\tpoints:\t1\t1\n"
+        b"ETH-USD\t002.000000\tpoints:\t2\n"
+    )
+
+
+def test_reporter_full_report_on_timer():
+    output = io.BytesIO()
+    store = _store()
+    reporter = Reporter(store, output, changed_only=False, every_ms=5)
+
+    reporter.publish(store.update("BTC-USD"))
+    deadline = time.monotonic() + 2
+    while not output.getvalue() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    reporter.close()
+
+    assert output.getvalue() == store.report(point_counts=True).encode()
+
+
+def test_reporter_lines_match_store_report():
+    store = VWAPStore(["BTC-USD", "ETH-USD"], "price", "last_size", window=[2, 5])
+    for price in (10, 11, 12):
+        store.store(
+            {
+                "type": "ticker",
+                "product_id": "BTC-USD",
+                "price": price,
+                "last_size": "1",
+            }
+        )
+    reporter = Reporter(store, io.BytesIO())
+    assert reporter.format(store.update("BTC-USD")) == (
+        store.report(point_counts=True).splitlines(keepends=True)[0].encode()
+    )
@@ -0,0 +1,58 @@
+from array import array
+
+import pytest
+
+from ringbuffer import RingBuffer
+
+
+def test_ring_buffer_wraps_oldest_first():
+    ring = RingBuffer(3)
+    for price in [1.0, 2.0, 3.0, 4.0, 5.0]:
+        ring.append(price, 1.0)
+
+    assert len(ring) == 3
+    assert list(ring) == [(3.0, 1.0), (4.0, 1.0), (5.0, 1.0)]
+    assert ring.vwap() == 4.0
+    assert isinstance(ring.prices, array)
+
+
+def test_ring_buffer_reanchor_keeps_sums():
+    ring = RingBuffer(4)
+    for i in range(4 * RingBuffer.REANCHOR_ROTATIONS + 2):
+        ring.append(1000.0 + i * 0.1, 0.5 + (i % 3) * 0.25)
+
+    assert ring.laps == 0
+    assert ring.sums_pq[0] == pytest.approx(sum(p * q for p, q in ring))
+    assert ring.sums_q[0] == pytest.approx(sum(q for _, q in ring))
+
+
+def test_ring_buffer_empty_and_invalid():
+    assert RingBuffer(5).vwap() == 0.0
+    with pytest.raises(ValueError):
+        RingBuffer(0)
+
+
+def test_ring_buffer_horizons_share_one_buffer():
+    ring = RingBuffer((2, 5))
+    for price in [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]:
+        ring.append(price, 1.0)
+
+    assert ring.size == 5
+    assert (ring.points(0), ring.points(1)) == (2, 5)
+    assert ring.vwap(0) == 6.5
+    assert ring.vwap(1) == 5.0
+    ring.reanchor()
+    assert (ring.vwap(0), ring.vwap(1)) == (6.5, 5.0)
+
+
+def test_ring_buffer_horizons_through_reanchors():
+    ring = RingBuffer((3, 10))
+    points = []
+    for i in range(10 * RingBuffer.REANCHOR_ROTATIONS * 3 + 7):
+        point = (100.0 + i % 17 * 0.3, 0.5 + i % 5 * 0.25)
+        ring.append(*point)
+        points.append(point)
+        for idx, horizon in enumerate(ring.horizons):
+            newest = points[-horizon:]
+            expected = sum(p * q for p, q in newest) / sum(q for _, q in newest)
+            assert ring.vwap(idx) == pytest.approx(expected, rel=1e-12)
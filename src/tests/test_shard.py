@@ -0,0 +1,37 @@
+import socket
+from threading import Thread
+
+from handshake import accept_upgrade
+from shard import ShardedCoinvwap, split_products
+
+
+def _serve_sample(server, connections):
+    for _ in range(connections):
+        conn, _ = server.accept()
+        accept_upgrade(conn)
+        conn.recv(4096)  # subscription
+        with open("src/tests/data/recv.stream_sample", "rb") as sample:
+            conn.sendall(sample.read())
+        conn.close()
+
+
+def test_split_products():
+    assert split_products(["A", "B", "C"], 2) == [["A", "C"], ["B"]]
+    assert split_products(["A"], 4) == [["A"]]
+
+
+def test_sharded_coinvwap_merges_updates():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    Thread(target=_serve_sample, args=(server, 2), daemon=True).start()
+
+    sharded = ShardedCoinvwap(
+        ["BTC-USD", "ETH-USD", "ETH-BTC"], shards=2, url=f"ws://127.0.0.1:{port}/"
+    )
+    updates = list(sharded)
+    sharded.stop()
+    server.close()
+
+    assert len(updates) == 120
+    assert sorted(sharded.latest) == ["BTC-USD", "ETH-BTC", "ETH-USD"]
+    assert sharded.latest["BTC-USD"].points == 61
@@ -0,0 +1,47 @@
+import multiprocessing
+import uuid
+
+import pytest
+
+from shm import SharedVWAPReader, SharedVWAPTable
+from vwap import VWAPUpdate
+
+
+def _read_in_child(name, results):
+    reader = SharedVWAPReader(name)
+    results.put(reader.read_all())
+    reader.close()
+
+
+def test_shared_vwap_table_roundtrip():
+    name = f"cvwap-{uuid.uuid4().hex[:8]}"
+    table = SharedVWAPTable(name, ["BTC-USD", "ETH-USD"], capacity=3)
+    try:
+        table.publish(VWAPUpdate("BTC-USD", 44121.94, 3, "2022-02-17T01:29:45.108782Z"))
+        table.publish(VWAPUpdate("BTC-USD", 44122.5, 4, "2022-02-17T01:29:46.5Z"))
+        reader = SharedVWAPReader(name)
+        assert reader.read("BTC-USD") == (
+            "BTC-USD",
+            44122.5,
+            4,
+            2,
+            1645061386.5,
+        )
+        assert reader.read("ETH-USD").sequence == 0
+
+        table.publish(VWAPUpdate("ETH-BTC", 0.07, 1))
+        reader.refresh()
+        assert reader.read("ETH-BTC").vwap == 0.07
+        with pytest.raises(ValueError):
+            table.publish(VWAPUpdate("SOL-USD", 1.0, 1))
+
+        results = multiprocessing.Queue()
+        child = multiprocessing.Process(target=_read_in_child, args=(name, results))
+        child.start()
+        shared = results.get(timeout=10)
+        child.join()
+        assert [item.product_id for item in shared] == ["BTC-USD", "ETH-USD", "ETH-BTC"]
+        reader.close()
+    finally:
+        table.close()
+        table.unlink()
@@ -0,0 +1,91 @@
+import os
+
+from snapshot import SnapshotSink, restore_snapshot, write_snapshot
+from vwap import VWAPStore
+
+
+def _ticker(product_id, price, size, stamp="2022-02-17T01:29:30.220661Z"):
+    return {
+        "time": stamp,
+        "type": "ticker",
+        "product_id": product_id,
+        "price": str(price),
+        "last_size": str(size),
+    }
+
+
+def _store(window=5):
+    store = VWAPStore(
+        ["BTC-USD", "ETH-USD", "ETH-BTC"], "price", "last_size", window=window
+    )
+    for idx in range(12):
+        store.store(_ticker("BTC-USD", 100 + idx, 1 + idx % 3))
+    store.store(_ticker("ETH-USD", 10, 2))
+    return store
+
+
+def test_snapshot_roundtrip(tmp_path):
+    path = str(tmp_path / "vwap.snapshot")
+    store = _store()
+    assert store.snapshot(path) == 2
+    assert not os.path.exists(path + ".tmp")
+
+    restored = VWAPStore(
+        ["BTC-USD", "ETH-USD", "ETH-BTC"], "price", "last_size", window=5
+    )
+    assert restored.restore(path) == 2
+
+    assert restored.report(point_counts=True) == store.report(point_counts=True)
+    assert restored.times["BTC-USD"] == "2022-02-17T01:29:30.220661Z"
+    btc, saved = restored.prices_n_vols["BTC-USD"], store.prices_n_vols["BTC-USD"]
+    assert list(btc) == list(saved)
+    assert btc.sums_pq == saved.sums_pq and btc.head == saved.head
+
+    # the restored window keeps rolling like the original one
+    store.store(_ticker("BTC-USD", 200, 1))
+    restored.store(_ticker("BTC-USD", 200, 1))
+    assert restored.vwap("BTC-USD") == store.vwap("BTC-USD")
+
+
+def test_snapshot_other_horizons_and_max_age(tmp_path):
+    path = str(tmp_path / "vwap.snapshot")
+    store = _store()
+    store.store(_ticker("ETH-BTC", 0.07, 1, stamp="2000-01-01T00:00:00Z"))
+    write_snapshot(store, path)
+
+    resized = VWAPStore(["BTC-USD", "ETH-BTC"], "price", "last_size", window=[3, 10])
+    assert restore_snapshot(resized, path, max_age=3600 * 24 * 365 * 10) == 1
+    assert resized.points("BTC-USD", 10) == 5
+    newest = list(store.prices_n_vols["BTC-USD"])[-3:]
+    expected = sum(p * v for p, v in newest) / sum(v for _, v in newest)
+    assert abs(resized.vwap("BTC-USD", 3) - expected) < 1e-9
+    assert resized.points("ETH-BTC") == 0
+
+    assert restore_snapshot(VWAPStore(["X"], "price", "last_size"), path + "x") == 0
+
+
+def test_snapshot_sink(tmp_path):
+    path = str(tmp_path / "vwap.snapshot")
+    store = _store()
+    sink = SnapshotSink(store, path, every=3600)
+    sink.publish(store.update("BTC-USD"))
+    assert not os.path.exists(path)
+    sink.close()
+    assert sink.snapshots == 1
+    assert os.path.exists(path)
+
+
+def test_snapshot_sink_background(tmp_path):
+    path = str(tmp_path / "vwap.snapshot")
+    store = _store()
+    sink = SnapshotSink(store, path, every=0)
+    sink.publish(store.update("BTC-USD"))
+    assert sink.writer is not None
+    sink.writer.join()
+    assert sink.snapshots == 1
+    store.store(_ticker("BTC-USD", 43713, 1))
+    sink.close()
+    assert sink.snapshots >= 2
+    restored = VWAPStore(["BTC-USD"], "price", "last_size", window=5)
+    assert restore_snapshot(restored, path) == 1
+    assert restored.vwap("BTC-USD") == store.vwap("BTC-USD")
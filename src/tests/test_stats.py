@@ -0,0 +1,82 @@
+import asyncio
+import urllib.request
+
+from async_coinvwap import AsyncCoinvwap
+from coinvwap import Coinvwap
+from mockserver import MockCoinbaseServer
+from pipeline import Pipeline
+from stats import Histogram, Stats
+
+
+def test_histogram_buckets():
+    for value in (0, 1, 31, 32, 33, 1000, 123456789, 2**62):
+        index = Histogram.index(value)
+        assert Histogram.highest(index) >= value
+        # relative error bounded by the sub-bucket resolution
+        assert Histogram.highest(index) - value <= value / 2**Histogram.SUB_BITS
+        assert Histogram.index(Histogram.highest(index)) == index
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in range(1, 10001):
+        histogram.record(value * 1000)
+
+    assert histogram.count == 10000
+    assert histogram.max == 10_000_000
+    assert abs(histogram.percentile(0.5) - 5_000_000) <= 5_000_000 / 16
+    assert abs(histogram.percentile(0.99) - 9_900_000) <= 9_900_000 / 16
+    assert histogram.percentile(1.0) == 10_000_000
+    assert Histogram().percentile(0.5) == 0
+
+
+def test_stats_instrumented_listen():
+    server = MockCoinbaseServer(messages=300, products=3, coalesce=5).start()
+    stats = Stats()
+    cvp = Coinvwap(product_ids=server.product_ids, url=server.url, stats=stats)
+    cvp.connect()
+    cvp.listen()
+    cvp.sock.close()
+    server.stop()
+
+    snapshot = stats.snapshot()
+    for stage in ("decode", "parse", "store", "report", "exchange"):
+        assert snapshot["stages"][stage]["count"] == 300
+    assert snapshot["stages"]["recv"]["count"] >= 1
+    assert sum(p["messages"] for p in snapshot["products"].values()) == 300
+    assert snapshot["products"]["P000-USD"]["bytes"] > 0
+
+    metrics_server = stats.serve(port=0)
+    host, port = metrics_server.server_address[:2]
+    with urllib.request.urlopen(f"http://{host}:{port}/metrics") as response:
+        text = response.read().decode()
+    stats.close()
+    assert 'coinvwap_stage_seconds_count{stage="store"} 300' in text
+    assert 'coinvwap_product_messages_total{product_id="P001-USD"} 100' in text
+
+
+def test_stats_pipelined_and_async():
+    server = MockCoinbaseServer(messages=200, products=2, coalesce=4).start()
+    stats = Stats()
+    cvp = Coinvwap(product_ids=server.product_ids, url=server.url, stats=stats)
+    cvp.connect()
+    Pipeline(cvp, queue_size=50).listen()
+
+    async def collect():
+        client = AsyncCoinvwap(
+            product_ids=server.product_ids, url=server.url, stats=async_stats
+        )
+        updates = [update async for update in client]
+        await client.disconnect()
+        return updates
+
+    async_stats = Stats()
+    assert len(asyncio.run(collect())) == 200
+    server.stop()
+
+    for snapshot in (stats.snapshot(), async_stats.snapshot()):
+        for stage in ("decode", "parse", "store"):
+            assert snapshot["stages"][stage]["count"] == 200
+        assert snapshot["stages"]["recv"]["count"] >= 1
+        assert sum(p["messages"] for p in snapshot["products"].values()) == 200
+    assert stats.snapshot()["stages"]["report"]["count"] == 200
@@ -0,0 +1,106 @@
+import json
+import os
+import socket
+from threading import Thread
+
+import pytest
+
+from coinvwap import Coinvwap
+from handshake import accept_upgrade
+from mockserver import MockCoinbaseServer
+from payload import FrameDecoder
+from subscribe import ABNF
+from supervisor import SequenceTracker, Supervisor
+
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "data", "recv.stream_sample")
+
+
+def _sample_payloads():
+    decoder = FrameDecoder()
+    with open(SAMPLE, "rb") as sample:
+        decoder.feed(sample.read())
+    return [json.loads(bytes(data)) for _, data in decoder.frames()]
+
+
+def test_sequence_tracker_on_the_feed_sample():
+    payloads = _sample_payloads()
+    tracker = SequenceTracker()
+    for payload in payloads:
+        tracker.check(payload)
+    # ticker sequences jump, trade ids do not
+    assert not tracker.gaps and not tracker.stale
+    assert set(tracker.last) == {"BTC-USD", "ETH-USD", "ETH-BTC"}
+
+    tickers = [payload for payload in payloads if payload["type"] == "ticker"]
+    btc = [payload for payload in tickers if payload["product_id"] == "BTC-USD"]
+    lost, late = btc[3], btc[5]
+    tracker = SequenceTracker()
+    for payload in tickers:
+        if payload is not lost:
+            tracker.check(payload)
+    tracker.check(late)
+    assert tracker.gaps == {"BTC-USD": 1}
+    assert tracker.missed == {"BTC-USD": 1}
+    assert tracker.stale == {"BTC-USD": 1}
+    assert tracker.report() == "BTC-USD\tgaps:\t1\tmissed:\t1\n"
+
+
+def _serve_broken_then_valid(server):
+    # a continuation frame without a message, then one valid ticker
+    ticker = b'{"type":"ticker","product_id":"BTC-USD","price":"2","last_size":"1"}'
+    frames = (
+        ABNF(1, 0, 0, 0, ABNF.OPCODE_CONT, 0, b"x").format(),
+        ABNF(1, 0, 0, 0, ABNF.OPCODE_TEXT, 0, ticker).format(),
+    )
+    for frame in frames:
+        conn, _ = server.accept()
+        accept_upgrade(conn)
+        conn.recv(4096)
+        conn.sendall(frame)
+        conn.close()
+
+
+def test_supervisor_reconnects_on_protocol_errors():
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    Thread(target=_serve_broken_then_valid, args=(server,), daemon=True).start()
+    cvp = Coinvwap(product_ids=["BTC-USD"], url=f"ws://127.0.0.1:{port}/")
+    supervisor = Supervisor(cvp, backoff=0.001, max_retries=3)
+
+    for update in supervisor.updates():
+        assert update.product_id == "BTC-USD"
+        supervisor.stop()
+    server.close()
+    assert supervisor.reconnects == 1
+
+
+def test_supervisor_reconnects_with_warm_windows():
+    server = MockCoinbaseServer(messages=60, products=1).start()
+    cvp = Coinvwap(product_ids=server.product_ids, url=server.url)
+    supervisor = Supervisor(cvp, backoff=0.01)
+
+    updates = []
+    for update in supervisor.updates():
+        updates.append(update)
+        if len(updates) == 180:
+            supervisor.stop()
+    server.stop()
+
+    assert supervisor.reconnects == 2
+    # the window kept filling across the three connections
+    assert updates[-1].points == 180
+    # every connection restarts the mock sequence: stale, not gaps
+    assert not supervisor.tracker.gaps
+
+
+def test_supervisor_gives_up():
+    probe = socket.create_server(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    cvp = Coinvwap(product_ids=["BTC-USD"], url=f"ws://127.0.0.1:{port}/")
+    supervisor = Supervisor(cvp, backoff=0.001, max_retries=2)
+
+    with pytest.raises(ConnectionRefusedError):
+        list(supervisor.updates())
+    assert supervisor.reconnects == 2
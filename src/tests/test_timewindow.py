@@ -0,0 +1,80 @@
+import pytest
+
+from timewindow import TimeVWAPStore, TimeWindow
+from vwap import VWAPStore
+
+
+def _ticker(second, price, size, product_id="BTC-USD"):
+    return {
+        "type": "ticker",
+        "product_id": product_id,
+        "price": str(price),
+        "last_size": str(size),
+        "time": f"2022-02-17T01:29:{second:09.6f}Z",
+    }
+
+
+def test_time_vwap_store_horizons():
+    store = TimeVWAPStore(
+        ["BTC-USD", "ETH-USD"], "price", "last_size", horizons=(1.0, 10.0)
+    )
+    store.store(_ticker(0.0, 100, 1))
+    store.store(_ticker(5.0, 200, 1))
+    assert store.store(_ticker(5.5, 300, 2)) == "BTC-USD"
+    assert store.store({"type": "heartbeat"}) is None
+    assert store.store(_ticker(5.5, 1, 1, "OTHER-USD")) is None
+
+    assert store.vwap("BTC-USD", 1.0) == pytest.approx(800 / 3)
+    assert store.points("BTC-USD", 1.0) == 2
+    assert store.vwap("BTC-USD", 10.0) == 225.0
+    assert store.points("BTC-USD", 10.0) == 3
+
+    store.store(_ticker(12.0, 400, 1))
+    update = store.update("BTC-USD")
+    assert update.vwap == 400.0
+    assert update.vwaps == (400.0, 300.0)
+    assert update.time == "2022-02-17T01:29:12.000000Z"
+    assert store.report(point_counts=True) == (
+        "BTC-USD\t400.000000\t300.000000\tpoints:\t1\t3\n"
+        "ETH-USD\t000.000000\t000.000000\tpoints:\t0\t0\n"
+    )
+
+
+def test_time_window_compacts_and_reanchors():
+    window = TimeWindow((0.5, 2.0))
+    for idx in range(5000):
+        window.append(idx * 0.01, 100.0 + idx % 10, 1.0 + idx % 3)
+    window.append(0.0, 1.0, 1.0)  # out of order, counts as the newest
+
+    assert window.base > 0
+    assert window.points(1) == 201
+    expected = window.sums_pq[1]
+    window.reanchor()
+    assert window.sums_pq[1] == pytest.approx(expected)
+    assert window.vwap(0) == pytest.approx(window.sums_pq[0] / window.sums_q[0])
+
+
+def test_time_vwap_store_products_change():
+    store = TimeVWAPStore(["BTC-USD"], "price", "last_size", horizons=(1.0,))
+    assert store.add_products(["ETH-USD", "BTC-USD"]) == ["ETH-USD"]
+    assert store.store(_ticker(1.0, 10, 1, "ETH-USD")) == "ETH-USD"
+    assert store.update("ETH-USD").vwap == 10.0
+    assert store.remove_products(["BTC-USD"]) == ["BTC-USD"]
+    assert store.store(_ticker(1.0, 10, 1)) is None
+    assert store.dropped == 1
+    assert store.report() == "ETH-USD\t010.000000\n"
+
+
+def test_time_vwap_store_rejects_increments_and_snapshots(tmp_path):
+    with pytest.raises(TypeError):
+        TimeVWAPStore(["BTC-USD"], "price", "last_size", increments={})
+    store = TimeVWAPStore(["BTC-USD"], "price", "last_size")
+    store.store(_ticker(1.0, 10, 1))
+    with pytest.raises(TypeError):
+        store.snapshot(str(tmp_path / "vwap.snapshot"))
+
+    saved = VWAPStore(["BTC-USD"], "price", "last_size")
+    saved.store(_ticker(1.0, 10, 1))
+    saved.snapshot(str(tmp_path / "vwap.snapshot"))
+    with pytest.raises(TypeError):
+        store.restore(str(tmp_path / "vwap.snapshot"))
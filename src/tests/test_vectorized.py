@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from payload import split_frames
+from vwap import VWAPStore
+
+np = pytest.importorskip("numpy")
+from vectorized import (  # pylint: disable=wrong-import-position,wrong-import-order
+    VectorVWAPStore,
+)
+
+
+def _payloads(count, products):
+    rnd = random.Random(7)
+    return [
+        {
+            "type": "ticker" if idx % 11 else "heartbeat",
+            "product_id": rnd.choice(products),
+            "price": f"{rnd.uniform(10, 20):.2f}",
+            "last_size": f"{rnd.uniform(0.001, 2):.8f}",
+        }
+        for idx in range(count)
+    ]
+
+
+def test_vector_store_matches_vwap_store():
+    products = [f"P{idx}-USD" for idx in range(20)]
+    payloads = _payloads(5000, products + ["OTHER-USD"])
+    store = VWAPStore(products, "price", "last_size", window=50)
+    vector = VectorVWAPStore(products, "price", "last_size", window=50)
+
+    for payload in payloads:
+        store.store(payload)
+    for carret in range(0, len(payloads), 700):
+        vector.store_batch(payloads[carret : carret + 700])
+
+    for product_id in products:
+        assert vector.points(product_id) == store.points(product_id)
+        assert vector.vwap(product_id) == pytest.approx(store.vwap(product_id))
+    vector.reanchor()
+    assert vector.vwaps() == pytest.approx([store.vwap(pid) for pid in products])
+
+
+def test_vector_store_dirty_updates_and_report():
+    vector = VectorVWAPStore(["BTC-USD", "ETH-USD", "ETH-BTC"], "price", "last_size")
+    with open("src/tests/data/recv.stream_sample", "rb") as sample:
+        payloads = list(split_frames(sample.read))
+
+    assert vector.store(payloads[0]) == "ETH-USD"
+    assert vector.dirty_updates() == [vector.update("ETH-USD")]
+    assert not vector.dirty_updates()
+
+    store = VWAPStore(["BTC-USD", "ETH-USD", "ETH-BTC"], "price", "last_size")
+    store.store(payloads[0])
+    vector.store_batch(payloads[1:])
+    for payload in payloads[1:]:
+        store.store(payload)
+
+    assert vector.report(point_counts=True) == store.report(point_counts=True)
+    assert {update.product_id for update in vector.dirty_updates()} == {
+        "BTC-USD",
+        "ETH-USD",
+        "ETH-BTC",
+    }
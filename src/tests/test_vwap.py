@@ -36,3 +36,98 @@ def test_vwap_store():
         store.report()
         == "BTC-USD\t000.000000\nETH-USD\t000.000000\nETH-BTC\t000.046691\n"
     )
+
+
+def test_vwap_store_window_rolls_off():
+    store = VWAPStore(
+        product_ids=["ETH-BTC"],
+        price_field="price",
+        quantity_field="quantity",
+        type_field="match",
+        window=2,
+    )
+    for price, quantity in [(100.0, 5.0), (1.0, 1.0), (3.0, 1.0)]:
+        assert (
+            store.store(
+                {
+                    "type": "match",
+                    "product_id": "ETH-BTC",
+                    "price": price,
+                    "quantity": quantity,
+                }
+            )
+            == "ETH-BTC"
+        )
+
+    assert store.points("ETH-BTC") == 2
+    assert store.vwap("ETH-BTC") == 2.0
+
+
+def test_vwap_store_reanchor_matches_full_sum():
+    store = VWAPStore(
+        product_ids=["BTC-USD"],
+        price_field="price",
+        quantity_field="quantity",
+        window=3,
+    )
+    points = [(40000.0 + i * 0.37, 0.001 * (i % 7 + 1)) for i in range(100)]
+    for price, quantity in points:
+        store.store(
+            {
+                "type": "ticker",
+                "product_id": "BTC-USD",
+                "price": price,
+                "quantity": quantity,
+            }
+        )
+
+    last = points[-3:]
+    expected = sum(p * q for p, q in last) / sum(q for _, q in last)
+    assert abs(store.vwap("BTC-USD") - expected) < 1e-9
+    assert store.store({"type": "heartbeat"}) is None
+
+
+def test_vwap_store_multiple_windows():
+    store = VWAPStore(
+        product_ids=["BTC-USD"],
+        price_field="price",
+        quantity_field="quantity",
+        window=[2, 200, 1000],
+    )
+    for price in range(1, 301):
+        store.store(
+            {
+                "type": "ticker",
+                "product_id": "BTC-USD",
+                "price": float(price),
+                "quantity": 1.0,
+            }
+        )
+
+    assert store.vwap("BTC-USD") == 299.5
+    assert store.vwap("BTC-USD", 200) == 200.5
+    assert store.points("BTC-USD", 1000) == 300
+    assert store.update("BTC-USD").vwaps == (299.5, 200.5, 150.5)
+    assert store.report(point_counts=True) == (
+        "BTC-USD\t299.500000\t200.500000\t150.500000\tpoints:\t2\t200\t300\n"
+    )
+
+
+def test_vwap_store_add_remove_products():
+    product_ids = ["BTC-USD"]
+    store = VWAPStore(product_ids, "price", "last_size", window=[2, 4])
+    store.store({"type": "ticker", "product_id": "BTC-USD", "price": 2, "last_size": 1})
+
+    assert store.add_products(["ETH-USD", "ETH-USD", "BTC-USD"]) == ["ETH-USD"]
+    assert store.prices_n_vols["ETH-USD"].horizons == (2, 4)
+    assert store.store(
+        {"type": "ticker", "product_id": "ETH-USD", "price": 3, "last_size": 1}
+    )
+    assert store.remove_products(["BTC-USD", "XRP-USD"]) == ["BTC-USD"]
+    assert store.report() == "ETH-USD\t003.000000\t003.000000\n"
+    assert store.product_ids == ["ETH-USD"]
+    # the caller's list is left alone
+    assert product_ids == ["BTC-USD"]
+    assert not store.store(
+        {"type": "ticker", "product_id": "BTC-USD", "price": 2, "last_size": 1}
+    )
@@ -0,0 +1,147 @@
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from payload import parse_time
+from vwap import VWAPStore
+
+
+class TimeWindow:  # pylint: disable=too-many-instance-attributes
+    """
+    Time-based windows of several horizons over one shared buffer.
+
+    Points are appended in timestamp order, every horizon keeps the index of
+    its oldest point and its own running sums. Appending a point evicts the
+    points that left each horizon right away, so eviction is amortized O(1)
+    and reading a VWAP never rescans the window. Points that no horizon
+    needs anymore are dropped from the front of the buffer in bulk.
+    """
+
+    __slots__ = (
+        "horizons",
+        "times",
+        "prices",
+        "vols",
+        "base",
+        "starts",
+        "sums_pq",
+        "sums_q",
+        "appends",
+    )
+
+    # Recompute the running sums from the buffer after this many appends
+    REANCHOR_APPENDS = 1 << 16
+
+    def __init__(self, horizons: Sequence[float]) -> None:
+        self.horizons = tuple(horizons)
+        self.times = array("d")
+        self.prices = array("d")
+        self.vols = array("d")
+        # absolute index of times[0], points dropped so far
+        self.base = 0
+        # absolute index of the oldest point in each horizon
+        self.starts = [0] * len(self.horizons)
+        self.sums_pq = [0.0] * len(self.horizons)
+        self.sums_q = [0.0] * len(self.horizons)
+        self.appends = 0
+
+    def append(self, timestamp: float, price: float, vol: float) -> None:
+        if self.times and timestamp < self.times[-1]:
+            # keep the buffer monotonic, late points count as the newest
+            timestamp = self.times[-1]
+        self.times.append(timestamp)
+        self.prices.append(price)
+        self.vols.append(vol)
+        for idx in range(len(self.horizons)):
+            self.sums_pq[idx] += price * vol
+            self.sums_q[idx] += vol
+        self.evict(timestamp)
+        self.appends += 1
+        if self.appends >= self.REANCHOR_APPENDS:
+            self.reanchor()
+
+    def evict(self, now: float) -> None:
+        """
+        Drop the points older than each horizon as of `now`.
+        """
+        times, prices, vols, base = self.times, self.prices, self.vols, self.base
+        end = base + len(times)
+        for idx, horizon in enumerate(self.horizons):
+            cutoff = now - horizon
+            start = self.starts[idx]
+            while start < end and times[start - base] <= cutoff:
+                self.sums_pq[idx] -= prices[start - base] * vols[start - base]
+                self.sums_q[idx] -= vols[start - base]
+                start += 1
+            self.starts[idx] = start
+        unused = min(self.starts) - base
+        if unused >= 1024 and unused * 2 >= len(times):
+            del times[:unused]
+            del prices[:unused]
+            del vols[:unused]
+            self.base += unused
+
+    def reanchor(self) -> None:
+        """
+        Recompute the running sums of every horizon from the buffer.
+        """
+        for idx, start in enumerate(self.starts):
+            offset = start - self.base
+            self.sums_pq[idx] = sum(
+                price * vol
+                for price, vol in zip(self.prices[offset:], self.vols[offset:])
+            )
+            self.sums_q[idx] = sum(self.vols[offset:])
+        self.appends = 0
+
+    def points(self, idx: int = 0) -> int:
+        return self.base + len(self.times) - self.starts[idx]
+
+    def vwap(self, idx: int = 0) -> float:
+        if self.points(idx) == 0 or self.sums_q[idx] == 0.0:
+            return 0.0
+        return self.sums_pq[idx] / self.sums_q[idx]
+
+
+class TimeVWAPStore(VWAPStore):
+    """
+    VWAPStore counterpart with time-based windows, e.g. the last 1s, 1m and 5m,
+    measured with the exchange timestamp of every payload (`time_field`).
+    All the horizons of a product are served from one shared TimeWindow,
+    the reads, updates, report and product changes are VWAPStore's.
+    Takes VWAPStore's arguments, `horizons` (seconds) instead of `window`;
+    the prices and sizes are floats, `increments` is refused, and the
+    windows cannot be snapshotted (snapshot() and restore() raise a TypeError).
+    """
+
+    def __init__(
+        self,
+        product_ids: List[str],
+        *args,
+        horizons: Sequence[float] = (1.0, 60.0, 300.0),
+        **kwargs,
+    ) -> None:
+        if kwargs.get("increments") is not None:
+            raise TypeError("TimeVWAPStore has no fixed-point mode, drop increments")
+        super().__init__(product_ids, *args, window=tuple(horizons), **kwargs)
+
+    def new_window(self, product_id: str) -> TimeWindow:
+        return TimeWindow(self.horizons)
+
+    def store(self, payload: Dict) -> Optional[str]:
+        """
+        Store a single feed payload, returns the updated product_id or None.
+        """
+        if payload["type"] != self.type_field:
+            return None
+        product_id = payload["product_id"]
+        window = self.prices_n_vols.get(product_id)
+        if window is None:
+            self.dropped += 1
+            return None
+        window.append(
+            parse_time(payload[self.time_field]),
+            float(payload[self.price_field]),
+            float(payload[self.quantity_field]),
+        )
+        self.times[product_id] = payload[self.time_field]
+        return product_id
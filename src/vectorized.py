@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from vwap import VWAPUpdate, report_line
+
+
+class VectorVWAPStore:  # pylint: disable=too-many-instance-attributes
+    """
+    VWAPStore for thousands of products, backed by NumPy (optional dependency).
+
+    Every product's window is a row of one 2-D ring buffer, indexed by a
+    product_id -> row map. A batch of payloads is written with a handful of
+    array operations and running sums are updated for the whole batch at once,
+    so VWAPs of all (or only the updated, "dirty") products come out of one
+    vectorized division.
+
+    Takes VWAPStore's field arguments and one point-count `window` (no list
+    of horizons, no `increments`), and serves the same store(), vwap(),
+    points(), update() and report(). The product set is fixed and the
+    windows are not RingBuffers, so there is no add_products/remove_products
+    nor snapshots, and Coinvwap cannot use it as its store: feed it the
+    decoded payloads, ideally in batches with store_batch().
+    """
+
+    # Recompute the running sums from the windows after this many batches
+    REANCHOR_BATCHES = 4096
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        product_ids: Sequence[str],
+        price_field: str,
+        quantity_field: str,
+        type_field: str = "ticker",
+        window: int = 200,
+        time_field: str = "time",
+    ) -> None:
+        if np is None:
+            raise ImportError("VectorVWAPStore needs numpy installed")
+        self.product_ids = list(product_ids)
+        self.rows = {product_id: row for row, product_id in enumerate(product_ids)}
+        self.fields = (type_field, price_field, quantity_field, time_field)
+        self.window = window
+        shape = (len(self.product_ids), window)
+        self.prices = np.zeros(shape)
+        self.vols = np.zeros(shape)
+        self.heads = np.zeros(shape[0], dtype=np.int64)
+        self.counts = np.zeros(shape[0], dtype=np.int64)
+        self.sums = np.zeros((2, shape[0]))  # sum(p * q), sum(q)
+        self.dirty = np.zeros(shape[0], dtype=bool)
+        self.times = [None] * shape[0]
+        self.batches = 0
+
+    def store(self, payload: Dict) -> Optional[str]:
+        stored = self.store_batch((payload,))
+        return stored[0] if stored else None
+
+    def store_batch(self, payloads: Iterable[Dict]) -> List[str]:
+        """
+        Store a batch of feed payloads, returns the stored product_ids in order.
+        """
+        type_field, price_field, quantity_field, time_field = self.fields
+        rows, prices, vols, stored = [], [], [], []
+        for payload in payloads:
+            if payload["type"] != type_field:
+                continue
+            row = self.rows.get(payload["product_id"])
+            if row is None:
+                continue
+            rows.append(row)
+            prices.append(float(payload[price_field]))
+            vols.append(float(payload[quantity_field]))
+            self.times[row] = payload.get(time_field)
+            stored.append(payload["product_id"])
+        if rows:
+            self._put(np.array(rows), np.array(prices), np.array(vols))
+        return stored
+
+    def _put(self, rows, prices, vols) -> None:
+        # rank of every point among the points of its row in this batch
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        starts = np.flatnonzero(np.r_[True, sorted_rows[1:] != sorted_rows[:-1]])
+        per_row = np.diff(np.r_[starts, len(rows)])
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(rows)) - np.repeat(starts, per_row)
+        totals = np.zeros_like(self.heads)
+        np.add.at(totals, rows, 1)
+
+        # a row given more points than the window keeps only the last ones,
+        # so every slot is written at most once per batch
+        keep = ranks >= totals[rows] - self.window
+        rows, prices, vols, ranks = rows[keep], prices[keep], vols[keep], ranks[keep]
+        slots = (self.heads[rows] + ranks) % self.window
+
+        old_prices = self.prices[rows, slots]
+        old_vols = self.vols[rows, slots]
+        np.add.at(self.sums[0], rows, prices * vols - old_prices * old_vols)
+        np.add.at(self.sums[1], rows, vols - old_vols)
+        self.prices[rows, slots] = prices
+        self.vols[rows, slots] = vols
+
+        self.heads = (self.heads + totals) % self.window
+        self.counts = np.minimum(self.counts + totals, self.window)
+        self.dirty[rows] = True
+        self.batches += 1
+        if self.batches >= self.REANCHOR_BATCHES:
+            self.reanchor()
+
+    def reanchor(self) -> None:
+        """
+        Recompute the running sums from the windows.
+        """
+        self.sums[0] = np.einsum("ij,ij->i", self.prices, self.vols)
+        self.sums[1] = self.vols.sum(axis=1)
+        self.batches = 0
+
+    def vwaps(self, rows=None):
+        """
+        VWAP of the given rows (all of them by default) as one array.
+        """
+        sum_pq, sum_q = self.sums if rows is None else self.sums[:, rows]
+        result = np.zeros_like(sum_q)
+        np.divide(sum_pq, sum_q, out=result, where=sum_q != 0.0)
+        return result
+
+    def vwap(self, product_id: str) -> float:
+        return float(self.vwaps(self.rows[product_id]))
+
+    def points(self, product_id: str) -> int:
+        return int(self.counts[self.rows[product_id]])
+
+    def update(self, product_id: str) -> VWAPUpdate:
+        row = self.rows[product_id]
+        return VWAPUpdate(
+            product_id,
+            float(self.vwaps(row)),
+            int(self.counts[row]),
+            self.times[row],
+        )
+
+    def dirty_updates(self) -> List[VWAPUpdate]:
+        """
+        VWAPUpdates of the products stored since the previous call.
+        """
+        rows = np.flatnonzero(self.dirty)
+        self.dirty[rows] = False
+        return [
+            VWAPUpdate(self.product_ids[row], float(vwap), int(count), self.times[row])
+            for row, vwap, count in zip(rows, self.vwaps(rows), self.counts[rows])
+        ]
+
+    def report(self, point_counts=False) -> str:
+        return "".join(
+            report_line(product_id, (vwap,), (count,) if point_counts else None)
+            for product_id, vwap, count in zip(
+                self.product_ids, self.vwaps(), self.counts
+            )
+        )
@@ -1,62 +1,215 @@
-from collections import deque
-from typing import Dict, List
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 
+import fixedpoint
+from ringbuffer import RingBuffer
+from snapshot import restore_snapshot, write_snapshot
 
-class VWAPStore:
+
+class VWAPUpdate(NamedTuple):
+    """
+    Latest VWAP of a single product, emitted after each stored data point.
+    """
+
+    product_id: str
+    vwap: float
+    points: int
+    # exchange timestamp of the data point, as sent in the payload
+    time: Optional[str] = None
+    # VWAP of every horizon when the store keeps several, `vwap` is the first
+    vwaps: Optional[Tuple[float, ...]] = None
+    # point count of every horizon alongside `vwaps`
+    counts: Optional[Tuple[int, ...]] = None
+
+
+def report_line(
+    product_id: str, vwaps: Sequence[float], counts: Optional[Sequence[int]] = None
+) -> str:
+    """
+    Report line of a product: its VWAP of every horizon and, given,
+    its point count of every horizon.
+    """
+    line = product_id + "".join(f"\t{vwap:010f}" for vwap in vwaps)
+    if counts is not None:
+        line += "\tpoints:" + "".join(f"\t{count}" for count in counts)
+    return line + "\n"
+
+
+class VWAPStore:  # pylint: disable=too-many-instance-attributes
     """
-    Storage for the 200 data points and computation of VWAP indicator.
+    Storage for the sliding window of data points (200 by default)
+    and computation of VWAP indicator.
+
+    Every product keeps its window in a RingBuffer with running sums,
+    so every update and every VWAP read is O(1) regardless of the window.
+    `window` can also be a list of sizes, e.g. [50, 200, 1000], all served
+    from one buffer per product; `vwap` and `points` then default to the
+    first of them and the report has a column for each.
+
+    With `increments` ({product_id: (quote_increment, base_increment)},
+    the strings of the exchange's product listing) the payload strings are
+    parsed into scaled integers and kept in FixedPointRingBuffer windows
+    with exact integer sums; products without an entry use 8 decimals,
+    so increments={} turns the fixed-point mode on for every product.
+    Values finer than the increment are rounded to it. The parsing runs in
+    Python: storing takes about twice as long as with float(), reading
+    the VWAPs costs the same.
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         product_ids: List[str],
         price_field: str,
         quantity_field: str,
         type_field: str = "ticker",
+        window: int or Sequence[int] = 200,
+        time_field: str = "time",
+        increments: Dict[str, Tuple[str, str]] or None = None,
     ) -> None:
-        self.product_ids = product_ids
+        self.product_ids = list(product_ids)
         self.price_field = price_field
         self.quantity_field = quantity_field
+        self.window = window
+        self.horizons = (window,) if isinstance(window, int) else tuple(window)
+        self.increments = increments
         self.prices_n_vols = {
-            product_id: deque(maxlen=200) for product_id in product_ids
+            product_id: self.new_window(product_id) for product_id in product_ids
         }
+        self.times = dict.fromkeys(product_ids)
         self.type_field = type_field
+        self.time_field = time_field
+        # payloads of products the store does not follow
+        self.dropped = 0
 
-    def store(self, payload: Dict) -> None:
-        if payload["type"] == self.type_field:
-            self._put(
-                payload["product_id"],
-                float(payload[self.price_field]),
-                float(payload[self.quantity_field]),
-            )
-
-    def _put(self, product_id: str, price: float, last_size: float) -> None:
-        if (
+    def add_products(self, product_ids: List[str]) -> List[str]:
+        """
+        Allocate empty windows for new products, returns the ones added.
+        """
+        added = [
+            product_id
+            for product_id in dict.fromkeys(product_ids)
+            if not self.follows(product_id)
+        ]
+        for product_id in added:
+            self.times[product_id] = None
+            self.product_ids.append(product_id)
+            self._add(product_id)
+        return added
+
+    def remove_products(self, product_ids: List[str]) -> List[str]:
+        """
+        Free the windows of the given products, returns the ones removed.
+        Payloads of removed products still in flight are dropped.
+        """
+        removed = [
             product_id
-            in self.prices_n_vols.keys()  # pylint: disable=consider-iterating-dictionary
-        ):
-            self.prices_n_vols[product_id].append((price, last_size))
-        else:
-            # TODO: more pro exception handling to be added
-            pass
-
-    @staticmethod
-    def vwap(prices: List[float], quantity: List[float]) -> float:
-        if len(quantity) == 0:
-            return 0.0
-        return sum([pj * qj for pj, qj in zip(prices, quantity)]) / sum(quantity)
-
-    @staticmethod
-    def vwap_formated(prices: List[float], vols: List[float]):
-        return f"{VWAPStore.vwap(prices, vols):010f}"
+            for product_id in dict.fromkeys(product_ids)
+            if self.follows(product_id)
+        ]
+        for product_id in removed:
+            del self.times[product_id]
+            self.product_ids.remove(product_id)
+            self._remove(product_id)
+        return removed
+
+    def follows(self, product_id: str) -> bool:
+        return product_id in self.prices_n_vols
+
+    def _add(self, product_id: str) -> None:
+        self.prices_n_vols[product_id] = self.new_window(product_id)
+
+    def _remove(self, product_id: str) -> None:
+        del self.prices_n_vols[product_id]
+
+    def store(self, payload: Dict) -> Optional[str]:
+        """
+        Store a single feed payload, returns the updated product_id or None.
+        """
+        if payload["type"] == self.type_field:
+            product_id = payload["product_id"]
+            price = payload[self.price_field]
+            last_size = payload[self.quantity_field]
+            if self.increments is None:
+                price, last_size = float(price), float(last_size)
+            else:
+                window = self.get_window(product_id)
+                if window is not None:
+                    price, last_size = window.parse(price, last_size)
+            if self._put(product_id, price, last_size):
+                self.times[product_id] = payload.get(self.time_field)
+                return product_id
+        return None
+
+    def _put(self, product_id: str, price: float, last_size: float) -> bool:
+        window = self.prices_n_vols.get(product_id)
+        if window is None:
+            self.dropped += 1
+            return False
+        window.append(price, last_size)
+        return True
+
+    def new_window(self, product_id: str) -> RingBuffer:
+        return fixedpoint.new_window(product_id, self.window, self.increments)
+
+    def get_window(self, product_id: str) -> Optional[RingBuffer]:
+        """
+        Window of a followed product, None for the others.
+        """
+        return self.prices_n_vols.get(product_id)
+
+    def _state(self, product_id: str):
+        """
+        What serves the VWAPs of a product, its window here.
+        """
+        return self.prices_n_vols[product_id]
+
+    def _states(self) -> List[Tuple[str, RingBuffer]]:
+        # products may come and go from another thread meanwhile
+        return list(self.prices_n_vols.items())
+
+    def vwap(self, product_id: str, horizon: int or None = None) -> float:
+        idx = 0 if horizon is None else self.horizons.index(horizon)
+        return self._state(product_id).vwap(idx)
+
+    def vwap_formated(self, product_id: str) -> str:
+        return f"{self.vwap(product_id):010f}"
+
+    def points(self, product_id: str, horizon: int or None = None) -> int:
+        idx = 0 if horizon is None else self.horizons.index(horizon)
+        return self._state(product_id).points(idx)
+
+    def update(self, product_id: str) -> VWAPUpdate:
+        window = self._state(product_id)
+        vwaps = counts = None
+        if len(self.horizons) > 1:
+            horizons = range(len(self.horizons))
+            vwaps = tuple(window.vwap(idx) for idx in horizons)
+            counts = tuple(window.points(idx) for idx in horizons)
+        return VWAPUpdate(
+            product_id,
+            window.vwap(),
+            window.points(),
+            self.times[product_id],
+            vwaps,
+            counts,
+        )
+
+    def snapshot(self, path: str) -> int:
+        """
+        Checkpoint the windows into a binary snapshot, see snapshot.py.
+        """
+        return write_snapshot(self, path)
+
+    def restore(self, path: str, max_age: float or None = None) -> int:
+        """
+        Warm start from a snapshot, skipping entries older than max_age seconds.
+        """
+        return restore_snapshot(self, path, max_age)
 
     def report(self, point_counts=False) -> str:
+        horizons = range(len(self.horizons))
         buff = ""
-        for product_id, product_item in self.prices_n_vols.items():
-            prices = [val[0] for val in product_item]
-            vols = [val[1] for val in product_item]
-            buff += f"{product_id}\t{VWAPStore.vwap_formated(prices, vols)}"
-            if point_counts:
-                buff += f"\tpoints:\t{len(product_item)}"
-            buff += "\n"
+        for product_id, product_item in self._states():
+            vwaps = [product_item.vwap(idx) for idx in horizons]
+            counts = [product_item.points(idx) for idx in horizons]
+            buff += report_line(product_id, vwaps, counts if point_counts else None)
         return buff